@@ -0,0 +1,126 @@
+import os
+import threading
+import numpy as np
+
+# Recall/latency knobs for the approximate course index
+ANN_NPROBE = int(os.getenv("RECOMMENDER_ANN_NPROBE", "8"))
+ANN_MIN_COURSES = int(os.getenv("RECOMMENDER_ANN_MIN_COURSES", "2000"))
+ANN_RETRAIN_GROWTH = float(os.getenv("RECOMMENDER_ANN_RETRAIN_GROWTH", "4"))
+
+
+def kmeans(vectors, nlist, iterations=10, sample_size=20000, seed=0):
+    """Spherical k-means on a sample of unit vectors; returns unit centroids."""
+    rng = np.random.default_rng(seed)
+    sample = vectors
+    if len(vectors) > sample_size:
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+
+        # Empty clusters keep their previous centroid
+        filled = norms[:, 0] > 0
+        centroids[filled] = sums[filled] / norms[filled]
+
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file index over unit vectors (inner product == cosine).
+
+    Vectors are bucketed by their nearest k-means centroid; a query only scores
+    the `nprobe` closest buckets. Raising nprobe trades latency for recall.
+    New rows are added to their nearest bucket without retraining; the
+    centroids are retrained once the index has grown by ANN_RETRAIN_GROWTH.
+    """
+
+    def __init__(self, nprobe=ANN_NPROBE, retrain_growth=ANN_RETRAIN_GROWTH):
+        self.nprobe = nprobe
+        self.retrain_growth = retrain_growth
+        self.lock = threading.Lock()
+        self.centroids = None
+        self.assignment = np.zeros(0, dtype=np.int64)
+        self.lists = []
+        self.trained_size = 0
+        self.revision = -1
+
+    def __len__(self):
+        return len(self.assignment)
+
+    def build(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        nlist = max(1, min(len(vectors), int(4 * np.sqrt(len(vectors)))))
+        self.centroids = kmeans(vectors, nlist)
+        self.assignment = np.zeros(0, dtype=np.int64)
+        self.lists = [[] for _ in range(nlist)]
+        self.trained_size = len(vectors)
+        self.add(vectors)
+
+    def add(self, vectors):
+        """Append rows len(self)..len(self)+len(vectors)-1 to their nearest bucket."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        first_row = len(self.assignment)
+        buckets = np.argmax(vectors @ self.centroids.T, axis=1)
+        for offset, bucket in enumerate(buckets):
+            self.lists[bucket].append(first_row + offset)
+        self.assignment = np.concatenate([self.assignment, buckets])
+
+    def update(self, rows, vectors):
+        """Move already indexed rows whose vectors changed to their new bucket."""
+        buckets = np.argmax(np.asarray(vectors, dtype=np.float32) @ self.centroids.T, axis=1)
+        for row, bucket in zip(rows, buckets):
+            old_bucket = self.assignment[row]
+            if old_bucket != bucket:
+                self.lists[old_bucket].remove(row)
+                self.lists[bucket].append(row)
+                self.assignment[row] = bucket
+
+    def search(self, query, k, vectors):
+        """
+        Approximate top-k rows of `vectors` for `query`, best first. Indexed
+        rows beyond len(vectors) are ignored, so a snapshot taken before the
+        index last grew is safe to search.
+        """
+        with self.lock:
+            nprobe = min(self.nprobe, len(self.lists))
+            probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+            candidates = np.fromiter(
+                (row for bucket in probe for row in self.lists[bucket]),
+                dtype=np.int64
+            )
+        # Rows added by a concurrent sync may be newer than the caller's snapshot of `vectors`
+        candidates = candidates[candidates < len(vectors)]
+        if len(candidates) == 0:
+            return candidates
+
+        scores = vectors[candidates].astype(np.float32) @ query
+        k = min(k, len(candidates))
+        best = np.argpartition(-scores, k - 1)[:k]
+        return candidates[best[np.argsort(-scores[best], kind="stable")]]
+
+    def sync(self, store):
+        """
+        Bring the index up to date with a CourseEmbeddingStore: retrain when it
+        has grown enough, otherwise add new rows and re-bucket edited ones.
+        """
+        with self.lock:
+            if self.revision == store.revision:
+                return
+
+            total = len(store.ids)
+            if self.centroids is None or total > self.retrain_growth * max(self.trained_size, 1):
+                print(f"🧭 Training ANN index over {total} course embeddings...")
+                self.build(store.vectors)
+            else:
+                edited = np.flatnonzero(store.row_revisions[:len(self)] > self.revision)
+                if len(edited):
+                    self.update(edited, store.vectors[edited])
+                if total > len(self):
+                    self.add(store.vectors[len(self):total])
+
+            self.revision = store.revision
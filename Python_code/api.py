@@ -0,0 +1,338 @@
+from flask import Flask, request, jsonify, Response, stream_with_context
+import json
+from dotenv import load_dotenv
+from flask_cors import CORS
+from llm_handler import chat, chat_stream, chat_cache, conversation_store, NO_ANSWER
+from llm_client import get_stats as get_llm_stats
+from db import connection, get_stats as get_db_stats
+from jobs import JobQueue, QueueFull
+from course_ingest import run_course_ingest
+from image_generation import generate_course_image
+from pathlib import Path
+from recommender_system import get_profile_recommendations, get_batch_recommendations, embedding_store, user_profiles
+
+app = Flask(__name__)
+CORS(app)
+load_dotenv()
+
+# Course ingests run in the background one at a time (see jobs.INGEST_WORKERS), so they can't starve chat and recommend
+ingest_queue = JobQueue("ingest")
+
+@app.route("/api/course-summaries/<int:course_id>", methods=["GET"])
+def get_course_summaries(course_id):
+    try:
+        # Get all module IDs for the course; the connection goes back to the pool before file reads
+        with connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM modules WHERE course_id = %s ORDER BY position", (course_id,))
+            module_ids = [row[0] for row in cursor.fetchall()]
+        
+        summaries = []
+        for module_id in module_ids:
+            try:
+                with open(f"module_summaries/module{module_id}_summary.txt", "r", encoding="utf-8") as f:
+                    summary = f.read().strip()
+                    if summary:
+                        summaries.append(summary
+                        )
+            except FileNotFoundError:
+                print(f"⚠️ No summary found for module {module_id}")
+                continue
+        
+        return jsonify({
+            "success": True,
+            "summaries": summaries
+        })
+        
+    except Exception as e:
+        print(f"❌ Error getting summaries: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route("/generate_image", methods=["POST"])
+def generate_image_endpoint():
+    """Flask API endpoint to generate and save an image"""
+    try:
+        data = request.get_json()
+        course_id = data.get("course_id")
+        course_title = data.get("course_title", "")
+        course_description = data.get("course_description", "")
+
+        print(f"🚀 Generating image for course: {course_title}")
+        result = generate_course_image(course_id,course_title,course_description)
+
+        return jsonify({
+            "success": True,
+            "message": "Image generated and saved successfully.",
+            "saved_paths": result
+        }), 200  # ✅ Return success message with HTTP 200
+
+    except Exception as e:
+        print(f"🔥 Error in image generation: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+
+@app.route("/api/chat", methods=["POST"])
+def chat_api():
+    data = request.get_json()
+
+    if not data or "question" not in data:
+        return jsonify({"success": False, "error": "question is required"}), 400
+
+    question = data["question"]
+    module_id = data.get("moduleId", "")
+    history = data.get("history", [])
+
+    print("module id: ",module_id)
+    
+
+    print(f"💬 Chat request: {question}")
+
+    # Streaming is opt-in; clients that don't ask for it get the single JSON response
+    wants_stream = data.get("stream") or "text/event-stream" in request.headers.get("Accept", "")
+    if wants_stream:
+        return Response(
+            stream_with_context(chat_event_stream(question, module_id, history)),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    try:
+        chat_response = chat(question, module_id, history)
+        return jsonify(chat_response)
+    except Exception as e:
+        print(f"🔥 Chat Error: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+def chat_event_stream(question, module_id, history):
+    """Server-sent events: one {"token"} event per chunk, then {"done", "response"} or {"error"}."""
+    parts = []
+    try:
+        for token in chat_stream(question, module_id, history):
+            parts.append(token)
+            yield f"data: {json.dumps({'token': token})}\n\n"
+        # Same fallback as the JSON path when the model produced no text
+        answer = "".join(parts)
+        yield f"data: {json.dumps({'done': True, 'success': True, 'response': answer if answer.strip() else NO_ANSWER})}\n\n"
+    except Exception as e:
+        print(f"🔥 Chat Stream Error: {e}")
+        yield f"data: {json.dumps({'done': True, 'success': False, 'error': str(e), 'response': ''.join(parts)})}\n\n"
+
+@app.route("/api/chat/cache/stats", methods=["GET"])
+def chat_cache_stats_api():
+    """Semantic chat cache size, hit rate and eviction counts."""
+    return jsonify({**chat_cache.stats(), "conversations": conversation_store.stats()})
+
+@app.route("/api/db/stats", methods=["GET"])
+def db_stats_api():
+    """Database pool size, utilisation and wait/timeout counters."""
+    return jsonify(get_db_stats())
+
+@app.route("/api/llm/stats", methods=["GET"])
+def llm_stats_api():
+    """Per-host LLM routing stats: load, health, circuit state and latency."""
+    return jsonify(get_llm_stats())
+
+@app.route("/insert_questions", methods=["POST"])
+def insert_questions_api():
+    """Queue the ingest pipeline for a course and return its job id right away (see /jobs/<job_id>)."""
+    data = request.get_json()
+
+    if not data or "course_id" not in data:
+        return jsonify({"success": False, "error": "course_id is required"}), 400
+
+    course_id = data["course_id"]
+    upsert = bool(data.get("upsert", False))
+    print(f"📥 Received request to insert questions for course_id: {course_id}")
+
+    try:
+        job, created = ingest_queue.submit(
+            "insert_questions",
+            lambda job: run_course_ingest(job, course_id, upsert=upsert),
+            key=f"course:{course_id}",
+            params={"course_id": course_id, "upsert": upsert}
+        )
+    except QueueFull as e:
+        return jsonify({"success": False, "error": str(e)}), 503
+
+    if not created:
+        print(f"⏩ Course {course_id} is already being ingested by job {job.id}")
+
+    return jsonify({
+        "success": True,
+        "job_id": job.id,
+        "state": job.state,
+        "already_running": not created,
+        "status_url": f"/jobs/{job.id}"
+    }), 202
+
+@app.route("/jobs", methods=["GET"])
+def list_jobs_api():
+    """Recent and active background jobs, newest first."""
+    return jsonify({"jobs": ingest_queue.statuses()})
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status_api(job_id):
+    """State, per-stage progress and timings, result or error of one background job."""
+    job = ingest_queue.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "job not found"}), 404
+    return jsonify(job.status())
+
+@app.route('/recommend', methods=['POST'])
+def recommend():
+    try:
+        data = request.get_json()
+        role = data.get('role')
+        user_id = data.get('user_id')
+
+        if not user_id:
+            return jsonify({'error': 'user_id is required'}), 400
+
+        user_id = int(user_id)
+
+        with connection() as conn, conn.cursor() as cursor:
+            # 🔹 Step 1: Fetch accessible courses (with or without user_id)
+            if role=="admin":
+                cursor.execute("""
+                    SELECT id, title, description
+                    FROM courses
+                """)
+            else:
+                cursor.execute("""
+                    SELECT c.id, c.title, c.description
+                    FROM course_access ca
+                    JOIN courses c ON ca.course_id = c.id
+                    WHERE ca.user_id = %s
+                """, (user_id,))
+
+
+            accessible_courses = [{'id': cid, 'title': title, 'description': desc} for cid, title, desc in cursor.fetchall()]
+
+            # 🔹 Step 2: Trust the stored profile (kept current by /recommend/profile); load enrollments
+            # only for a new user, a course with no embedding yet, or the periodic reconciliation
+            enrolled_courses = None
+            if user_profiles.get(user_id) is None or user_profiles.needs_resync(user_id):
+                cursor.execute("""
+                    SELECT c.id, c.title, c.description
+                    FROM enrollments e
+                    JOIN courses c ON e.course_id = c.id
+                    WHERE e.user_id = %s
+                """, (user_id,))
+                enrolled_courses = [{'id': cid, 'title': title, 'description': desc} for cid, title, desc in cursor.fetchall()]
+
+        # Encoding happens after the connection is back in the pool
+        if enrolled_courses is not None:
+            embedding_store.sync(enrolled_courses)
+            user_profiles.set_enrollments(user_id, [course['id'] for course in enrolled_courses])
+
+        # Only enrollments inside the accessible catalog count towards the profile, as in /recommend/batch
+        profile = user_profiles.get(user_id, {course['id'] for course in accessible_courses})
+        if profile is None:
+            return jsonify({'recommended_courses': []})
+
+        profile_vector, enrolled_ids = profile
+        if not accessible_courses or profile_vector is None:
+            return jsonify({'recommended_courses': []})
+
+        recommendations = get_profile_recommendations(accessible_courses, profile_vector, enrolled_ids)
+        return jsonify({'recommended_courses': recommendations})
+
+    except Exception as e:
+        print(f"❌ Error getting recommendations: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/recommend/profile', methods=['POST'])
+def update_recommendation_profile():
+    """Called by the Node server whenever a user enrolls in or leaves a course."""
+    try:
+        data = request.get_json() or {}
+        user_id = data.get('user_id')
+        course_id = data.get('course_id')
+        action = data.get('action', 'add')
+
+        if not user_id or not course_id or action not in ('add', 'remove'):
+            return jsonify({'error': 'user_id, course_id and action ("add" or "remove") are required'}), 400
+
+        user_id, course_id = int(user_id), int(course_id)
+
+        if action == 'add':
+            # Make sure the course has an embedding before folding it into the profile
+            if course_id not in embedding_store.row_of:
+                with connection() as conn, conn.cursor() as cursor:
+                    cursor.execute("SELECT id, title, description FROM courses WHERE id = %s", (course_id,))
+                    rows = cursor.fetchall()
+                embedding_store.sync([{'id': cid, 'title': title, 'description': desc} for cid, title, desc in rows])
+            user_profiles.add_enrollment(user_id, course_id)
+        else:
+            user_profiles.remove_enrollment(user_id, course_id)
+
+        return jsonify({'success': True})
+
+    except Exception as e:
+        print(f"❌ Error updating recommendation profile: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/recommend/batch', methods=['POST'])
+def recommend_batch():
+    try:
+        data = request.get_json() or {}
+        user_ids = data.get('user_ids')
+        top_n = int(data.get('top_n', 4))
+
+        if not user_ids or not isinstance(user_ids, list):
+            return jsonify({'error': 'user_ids must be a non-empty list'}), 400
+        if top_n < 1:
+            return jsonify({'error': 'top_n must be at least 1'}), 400
+
+        user_ids = list(dict.fromkeys(int(uid) for uid in user_ids))
+
+        with connection() as conn, conn.cursor() as cursor:
+
+            # 🔹 Step 1: Whole catalog once, shared by every user in the batch
+            cursor.execute("SELECT id, title, description FROM courses")
+            courses = [{'id': cid, 'title': title, 'description': desc} for cid, title, desc in cursor.fetchall()]
+
+            # 🔹 Step 2: Roles, access grants and enrollments for all users in set-based queries
+            cursor.execute("SELECT id, role FROM users WHERE id = ANY(%s)", (user_ids,))
+            admins = {uid for uid, role in cursor.fetchall() if role == "admin"}
+
+            cursor.execute("""
+                SELECT user_id, course_id
+                FROM course_access
+                WHERE user_id = ANY(%s)
+            """, (user_ids,))
+            access = {uid: (None if uid in admins else set()) for uid in user_ids}
+            for uid, course_id in cursor.fetchall():
+                if access[uid] is not None:
+                    access[uid].add(course_id)
+
+            cursor.execute("""
+                SELECT user_id, course_id
+                FROM enrollments
+                WHERE user_id = ANY(%s)
+            """, (user_ids,))
+            enrollments = {}
+            for uid, course_id in cursor.fetchall():
+                enrollments.setdefault(uid, set()).add(course_id)
+
+        recommendations = get_batch_recommendations(courses, access, enrollments, top_n=top_n)
+        return jsonify({'recommendations': {str(uid): recs for uid, recs in recommendations.items()}})
+
+    except Exception as e:
+        print(f"❌ Error getting batch recommendations: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
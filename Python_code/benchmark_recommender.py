@@ -0,0 +1,134 @@
+import time
+import numpy as np
+import pandas as pd
+from course_embeddings import top_k_indices
+from ann_index import IVFIndex
+
+# Micro-benchmarks for the recommender:
+#  1. ranking a similarity vector into the top-N recommendations, old Python
+#     sort + df.iloc loop vs the array-based top-k path;
+#  2. exact search vs the IVF index: recall@4 and p99 latency.
+# Run with: python benchmark_recommender.py
+
+CATALOG_SIZES = [10, 100, 1_000, 10_000, 100_000]
+ENROLLED = 3
+TOP_N = 4
+DIM = 384
+REPEATS = 5
+
+ANN_CATALOG_SIZES = [10_000, 100_000]
+ANN_NPROBES = [4, 8, 16, 32]
+ANN_QUERIES = 300
+ANN_TOPICS = 500
+
+
+def legacy_ranking(df, similarity_scores, current_titles, top_n=TOP_N):
+    top_results = sorted(
+        list(enumerate(similarity_scores)),
+        key=lambda x: x[1],
+        reverse=True
+    )
+
+    recommended = []
+    for i, score in top_results:
+        if df.iloc[i]['title'] not in current_titles:
+            recommended.append({
+                'id': int(df.iloc[i]['id']),
+                'title': df.iloc[i]['title']
+            })
+        if len(recommended) == top_n:
+            break
+    return recommended
+
+
+def vectorized_ranking(ids, titles, similarity_scores, enrolled, top_n=TOP_N):
+    return [
+        {'id': int(ids[i]), 'title': titles[i]}
+        for i in top_k_indices(similarity_scores, enrolled, top_n)
+    ]
+
+
+def best_time(fn, repeats=REPEATS):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def run():
+    rng = np.random.default_rng(0)
+    print(f"{'courses':>10} {'legacy (ms)':>14} {'vectorized (ms)':>16} {'speedup':>9}")
+
+    for size in CATALOG_SIZES:
+        courses = [{'id': i + 1, 'title': f"Course {i + 1}"} for i in range(size)]
+        df = pd.DataFrame(courses)
+        ids = df['id'].to_numpy()
+        titles = df['title'].to_numpy(dtype=object)
+
+        embeddings = rng.standard_normal((size, DIM)).astype(np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        current_titles = [course['title'] for course in courses[:ENROLLED]]
+        enrolled = np.isin(titles, current_titles)
+        similarity_scores = embeddings @ embeddings[enrolled].mean(axis=0)
+
+        legacy_s, legacy = best_time(lambda: legacy_ranking(df, similarity_scores, current_titles))
+        vector_s, vector = best_time(lambda: vectorized_ranking(ids, titles, similarity_scores, enrolled))
+
+        if [r['id'] for r in legacy] != [r['id'] for r in vector]:
+            print(f"⚠️ Rankings differ for {size} courses")
+
+        print(f"{size:>10} {legacy_s * 1000:>14.3f} {vector_s * 1000:>16.3f} {legacy_s / vector_s:>8.1f}x")
+
+
+def clustered_embeddings(rng, size, topics=ANN_TOPICS, dim=DIM, spread=0.35):
+    """Unit vectors grouped around topic centres, closer to real course text than pure noise."""
+    centres = rng.standard_normal((topics, dim)).astype(np.float32)
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+    vectors = centres[rng.integers(0, topics, size)]
+    vectors = vectors + spread * rng.standard_normal((size, dim)).astype(np.float32) / np.sqrt(dim)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def run_ann():
+    rng = np.random.default_rng(1)
+    print(f"\n{'courses':>10} {'engine':>12} {'recall@4':>9} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+
+    for size in ANN_CATALOG_SIZES:
+        vectors = clustered_embeddings(rng, size)
+        stored = vectors.astype(np.float16)
+        no_exclusions = np.zeros(size, dtype=bool)
+
+        # Each query is the mean profile of a few "enrolled" courses
+        queries = []
+        for _ in range(ANN_QUERIES):
+            profile = vectors[rng.choice(size, ENROLLED, replace=False)].mean(axis=0)
+            queries.append(profile / np.linalg.norm(profile))
+
+        exact_results, exact_timings = [], []
+        for query in queries:
+            start = time.perf_counter()
+            scores = stored.astype(np.float32) @ query
+            exact_results.append(set(top_k_indices(scores, no_exclusions, TOP_N)))
+            exact_timings.append(time.perf_counter() - start)
+        print(f"{size:>10} {'exact':>12} {1.0:>9.3f} "
+              f"{np.percentile(exact_timings, 50) * 1000:>9.3f} {np.percentile(exact_timings, 99) * 1000:>9.3f}")
+
+        index = IVFIndex()
+        index.build(stored)
+        for nprobe in ANN_NPROBES:
+            index.nprobe = nprobe
+            hits, timings = 0, []
+            for query, expected in zip(queries, exact_results):
+                start = time.perf_counter()
+                found = index.search(query, TOP_N, stored)
+                timings.append(time.perf_counter() - start)
+                hits += len(expected.intersection(found.tolist()))
+            print(f"{size:>10} {'ivf/' + str(nprobe):>12} {hits / (TOP_N * len(queries)):>9.3f} "
+                  f"{np.percentile(timings, 50) * 1000:>9.3f} {np.percentile(timings, 99) * 1000:>9.3f}")
+
+
+if __name__ == "__main__":
+    run()
+    run_ann()
@@ -0,0 +1,143 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Semantic cache for chat answers; see SemanticChatCache
+CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", "1000"))
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "86400"))
+CHAT_CACHE_THRESHOLD = float(os.getenv("CHAT_CACHE_THRESHOLD", "0.92"))
+
+
+def history_key(history):
+    """Histories that differ only in case or whitespace share a key; no history is ""."""
+    if not history:
+        return ""
+    normalized = "\n".join(
+        " ".join(str(part).lower().split())
+        for pair in history for part in pair
+    )
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+class SemanticChatCache:
+    """
+    Answers keyed by (module id, question embedding). A lookup hits when a
+    cached question for the same module and an equivalent history has cosine
+    similarity >= threshold with the new one.
+
+    Each entry remembers the module's context version (mtimes of its summary
+    and transcript); entries go stale as soon as either file changes. Entries
+    are evicted least-recently-used beyond max_entries, and after ttl seconds.
+    """
+
+    def __init__(self, model, max_entries=CHAT_CACHE_SIZE, ttl=CHAT_CACHE_TTL, threshold=CHAT_CACHE_THRESHOLD,
+                 summary_folder="module_summaries", transcript_folder="module_transcripts"):
+        self.model = model
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.summary_folder = summary_folder
+        self.transcript_folder = transcript_folder
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # entry id -> entry, least recently used first
+        self.by_module = {}  # module id -> set of entry ids
+        self.next_id = 0
+        self.metrics = {"hits": 0, "misses": 0, "stores": 0, "evicted_lru": 0, "expired": 0, "invalidated": 0}
+
+    def embed(self, question):
+        vector = self.model.encode([question], normalize_embeddings=True, show_progress_bar=False)[0]
+        return np.asarray(vector, dtype=np.float32)
+
+    def context_version(self, module_id):
+        version = []
+        for path in (
+            os.path.join(self.summary_folder, f"module{module_id}_summary.txt"),
+            os.path.join(self.transcript_folder, f"module{module_id}_transcript.txt"),
+        ):
+            try:
+                version.append(os.path.getmtime(path))
+            except OSError:
+                version.append(None)
+        return tuple(version)
+
+    def remove(self, entry_id, reason):
+        entry = self.entries.pop(entry_id)
+        ids = self.by_module.get(entry["module_id"])
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del self.by_module[entry["module_id"]]
+        self.metrics[reason] += 1
+
+    def lookup(self, module_id, question_vector, history=None):
+        """Cached answer for a similar question, or None."""
+        module_id = str(module_id)
+        version = self.context_version(module_id)
+        key = history_key(history)
+        now = time.monotonic()
+
+        with self.lock:
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self.by_module.get(module_id, ())):
+                entry = self.entries[entry_id]
+                if entry["version"] != version:
+                    self.remove(entry_id, "invalidated")
+                    continue
+                if now - entry["created"] > self.ttl:
+                    self.remove(entry_id, "expired")
+                    continue
+                if entry["history"] != key:
+                    continue
+                score = float(entry["vector"] @ question_vector)
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.metrics["misses"] += 1
+                return None
+
+            self.entries.move_to_end(best_id)
+            self.metrics["hits"] += 1
+            return self.entries[best_id]["response"]
+
+    def store(self, module_id, question_vector, history, response):
+        module_id = str(module_id)
+        entry = {
+            "module_id": module_id,
+            "vector": question_vector,
+            "history": history_key(history),
+            "version": self.context_version(module_id),
+            "created": time.monotonic(),
+            "response": response,
+        }
+        with self.lock:
+            entry_id = self.next_id
+            self.next_id += 1
+            self.entries[entry_id] = entry
+            self.by_module.setdefault(module_id, set()).add(entry_id)
+            self.metrics["stores"] += 1
+
+            while len(self.entries) > self.max_entries:
+                self.remove(next(iter(self.entries)), "evicted_lru")
+
+    def invalidate(self, module_id):
+        """Drop every cached answer for a module (e.g. after re-ingesting it)."""
+        with self.lock:
+            for entry_id in list(self.by_module.get(str(module_id), ())):
+                self.remove(entry_id, "invalidated")
+
+    def stats(self):
+        with self.lock:
+            lookups = self.metrics["hits"] + self.metrics["misses"]
+            return {
+                **self.metrics,
+                "entries": len(self.entries),
+                "modules": len(self.by_module),
+                "hit_rate": round(self.metrics["hits"] / lookups, 4) if lookups else None,
+                "threshold": self.threshold,
+                "ttl_s": self.ttl,
+                "max_entries": self.max_entries,
+            }
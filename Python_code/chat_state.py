@@ -0,0 +1,108 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from token_budget import estimate_tokens, truncate_to_tokens
+from chat_cache import history_key
+
+# Token budget for previous Q&A turns in a freshly built chat prompt
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "600"))
+# Ollama conversation contexts kept for continuing a chat without resending it
+CHAT_STATE_SIZE = int(os.getenv("CHAT_STATE_SIZE", "500"))
+CHAT_STATE_TTL = float(os.getenv("CHAT_STATE_TTL", "1800"))
+# Start over with a fresh, budgeted prompt once a conversation's context grows past this
+CHAT_STATE_MAX_TOKENS = int(os.getenv("CHAT_STATE_MAX_TOKENS", "6000"))
+
+
+def budget_history(history, max_tokens=CHAT_HISTORY_TOKENS):
+    """
+    Render Q&A history newest-first within max_tokens. Recent turns are kept
+    whole (the newest one truncated if it alone is over budget); older turns
+    are reduced to their question, and whatever still doesn't fit is counted
+    as omitted.
+    """
+    lines, used, omitted = [], 0, 0
+    whole = True
+    for index, (q, a) in enumerate(reversed(history or [])):
+        full = f"Q: {q}\nA: {a}\n"
+        tokens = estimate_tokens(full)
+        if whole and used + tokens <= max_tokens:
+            lines.append(full)
+            used += tokens
+            continue
+        whole = False
+        if index == 0:
+            answer = truncate_to_tokens(str(a), max(1, max_tokens - estimate_tokens(str(q)) - 2))
+            lines.append(f"Q: {q}\nA: {answer}\n")
+            used = max_tokens
+            continue
+
+        short = f"Q: {truncate_to_tokens(str(q), 40)}\n"
+        tokens = estimate_tokens(short)
+        if used + tokens <= max_tokens:
+            lines.append(short)
+            used += tokens
+        else:
+            omitted += 1
+
+    lines.reverse()
+    if omitted:
+        lines.insert(0, f"({omitted} earlier exchange(s) omitted)\n")
+    return "".join(lines)
+
+
+def conversation_key(module_id, history):
+    return hashlib.sha1(f"{module_id}|{history_key(history)}".encode("utf-8")).hexdigest()
+
+
+class ConversationStore:
+    """
+    Ollama `context` arrays for live conversations, keyed by module id plus the
+    full Q&A history that produced them. The chat widget resends its history on
+    every turn, so the next request finds the state for (history + last turn)
+    without needing a session id.
+    """
+
+    def __init__(self, max_entries=CHAT_STATE_SIZE, ttl=CHAT_STATE_TTL, max_tokens=CHAT_STATE_MAX_TOKENS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_tokens = max_tokens
+        self.lock = threading.Lock()
+        self.states = OrderedDict()
+        self.metrics = {"reused": 0, "fresh": 0, "stored": 0, "too_long": 0}
+
+    def get(self, module_id, history):
+        if not history:
+            return None
+        key = conversation_key(module_id, history)
+        with self.lock:
+            state = self.states.get(key)
+            if state is None or time.monotonic() - state["created"] > self.ttl:
+                self.states.pop(key, None)
+                self.metrics["fresh"] += 1
+                return None
+            self.states.move_to_end(key)
+            self.metrics["reused"] += 1
+            return state
+
+    def put(self, module_id, history, context, rows):
+        """Remember the context after answering; history includes the new turn."""
+        if not context:
+            return
+        with self.lock:
+            if len(context) > self.max_tokens:
+                self.metrics["too_long"] += 1
+                return
+            self.states[conversation_key(module_id, history)] = {
+                "context": context,
+                "rows": rows,
+                "created": time.monotonic(),
+            }
+            self.metrics["stored"] += 1
+            while len(self.states) > self.max_entries:
+                self.states.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {**self.metrics, "conversations": len(self.states)}
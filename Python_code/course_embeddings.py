@@ -0,0 +1,160 @@
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+
+# Where the course embedding store lives on disk and how compactly it is kept
+EMBEDDING_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", "course_embeddings")
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "float16")
+
+
+def description_hash(description):
+    """Stable hash of a course description, used to detect edited courses."""
+    return hashlib.sha1((description or "").encode("utf-8")).hexdigest()
+
+
+class CourseEmbeddingStore:
+    """
+    Persistent cache of course description embeddings keyed by course id.
+
+    Vectors are L2-normalised when encoded, so cosine similarity against the
+    store is a plain dot product. On disk the store is two files:
+    vectors.npy (rows x dim, float16/float32) and index.json (row -> id, hash,
+    plus the name of the model that encoded them). A store written by a
+    different model is discarded and re-encoded.
+    """
+
+    def __init__(self, model, folder=EMBEDDING_STORE_DIR, dtype=EMBEDDING_DTYPE, model_name=None):
+        self.model = model
+        self.model_name = model_name
+        self.folder = folder
+        self.dtype = np.dtype(dtype)
+        self.lock = threading.RLock()
+        self.ids = []
+        self.hashes = []
+        self.row_of = {}
+        # Bumped on every change so derived indexes know which rows to refresh
+        self.revision = 0
+        self.row_revisions = np.zeros(0, dtype=np.int64)
+        self.vectors = np.zeros((0, model.get_sentence_embedding_dimension()), dtype=self.dtype)
+        self.load()
+
+    @property
+    def vectors_path(self):
+        return os.path.join(self.folder, "vectors.npy")
+
+    @property
+    def index_path(self):
+        return os.path.join(self.folder, "index.json")
+
+    def load(self):
+        if not (os.path.exists(self.vectors_path) and os.path.exists(self.index_path)):
+            print(f"📭 No course embedding store found in {self.folder}. Starting empty.")
+            return
+
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            vectors = np.load(self.vectors_path)
+
+            if index.get("model") != self.model_name:
+                print(f"⚠️ Course embedding store in {self.folder} was built with model {index.get('model')!r}, "
+                      f"not {self.model_name!r}. Starting empty.")
+                return
+
+            if len(index["ids"]) != len(vectors) or vectors.shape[1] != self.vectors.shape[1]:
+                print(f"⚠️ Course embedding store in {self.folder} is inconsistent. Starting empty.")
+                return
+
+            self.ids = [int(cid) for cid in index["ids"]]
+            self.hashes = list(index["hashes"])
+            self.row_of = {cid: row for row, cid in enumerate(self.ids)}
+            self.vectors = vectors.astype(self.dtype, copy=False)
+            self.row_revisions = np.zeros(len(self.ids), dtype=np.int64)
+            print(f"✅ Loaded {len(self.ids)} course embeddings from {self.folder}")
+        except Exception as e:
+            print(f"❌ Failed to load course embedding store: {e}")
+
+    def save(self):
+        os.makedirs(self.folder, exist_ok=True)
+
+        # Write to temp files first so a crash never leaves a half-written store
+        tmp_vectors = self.vectors_path + ".tmp.npy"
+        tmp_index = self.index_path + ".tmp"
+        np.save(tmp_vectors, self.vectors)
+        with open(tmp_index, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_name, "ids": self.ids, "hashes": self.hashes}, f)
+        os.replace(tmp_vectors, self.vectors_path)
+        os.replace(tmp_index, self.index_path)
+
+    def sync(self, courses):
+        """
+        Make sure every course has an up-to-date embedding and return the store
+        rows for `courses`, in the same order. Only new or changed descriptions
+        are encoded.
+        """
+        with self.lock:
+            stale = {}
+            for course in courses:
+                cid = int(course["id"])
+                digest = description_hash(course.get("description"))
+                row = self.row_of.get(cid)
+                if row is None or self.hashes[row] != digest:
+                    stale[cid] = (course.get("description") or "", digest)
+
+            if stale:
+                print(f"🧮 Encoding {len(stale)} new or changed course description(s)...")
+                stale_ids = list(stale.keys())
+                encoded = self.model.encode(
+                    [stale[cid][0] for cid in stale_ids],
+                    convert_to_numpy=True,
+                    normalize_embeddings=True
+                ).astype(self.dtype)
+
+                self.revision += 1
+                new_rows = []
+                for cid, vector in zip(stale_ids, encoded):
+                    row = self.row_of.get(cid)
+                    if row is None:
+                        self.row_of[cid] = len(self.ids)
+                        self.ids.append(cid)
+                        self.hashes.append(stale[cid][1])
+                        new_rows.append(vector)
+                    else:
+                        self.hashes[row] = stale[cid][1]
+                        self.vectors[row] = vector
+                        self.row_revisions[row] = self.revision
+
+                if new_rows:
+                    self.vectors = np.vstack([self.vectors, np.stack(new_rows)])
+                    self.row_revisions = np.concatenate([
+                        self.row_revisions,
+                        np.full(len(new_rows), self.revision, dtype=np.int64)
+                    ])
+
+                self.save()
+
+            return np.array([self.row_of[int(course["id"])] for course in courses], dtype=np.int64)
+
+    def get_matrix(self, courses):
+        """Float32 embedding matrix for `courses`, one row per course."""
+        with self.lock:
+            rows = self.sync(courses)
+            return self.vectors[rows].astype(np.float32)
+
+
+def top_k_indices(scores, exclude, top_n):
+    """
+    Indices of the `top_n` highest scores whose `exclude` mask is False,
+    best first. Uses argpartition so only the winners are fully sorted.
+    """
+    candidates = np.flatnonzero(~exclude)
+    if top_n <= 0 or len(candidates) == 0:
+        return candidates[:0]
+
+    if len(candidates) > top_n:
+        winners = np.argpartition(-scores[candidates], top_n - 1)[:top_n]
+        candidates = candidates[winners]
+
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
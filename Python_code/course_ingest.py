@@ -0,0 +1,176 @@
+import os
+import re
+from transcript_generator import generate_transcripts
+from question_generator import generate_all_questions_from_transcripts_folder
+from question_insertion import insert_course_questions
+from summary_generator import summarize_folder
+from lesson_manifest import LessonManifest
+from source_hashes import file_source_hash, is_current
+from llm_handler import transcript_index, chat_cache
+
+video_transcripts_folder = "video_transcripts"
+module_transcripts_folder = "module_transcripts"
+video_summaries_folder = "video_summaries"
+module_summaries_folder = "module_summaries"
+generated_questions_folder = "generated_questions"
+
+# Written by question_generator as module<id>_transcript_questions.json
+QUESTION_FILE = re.compile(r"^module(\d+)_transcript_questions\.json$")
+
+
+def question_file_module_id(file_name):
+    """Module id a generated-questions file belongs to, or None if the name doesn't say."""
+    match = QUESTION_FILE.match(file_name)
+    return int(match.group(1)) if match else None
+
+
+def run_course_ingest(job, course_id, upsert=False):
+    """
+    The /insert_questions pipeline for one course: lesson inventory,
+    transcripts and captions, summaries, MCQ generation and question
+    insertion. Runs as a background job; each step is a job stage, and the
+    returned dict becomes the job result.
+    """
+    result = {
+        "course_id": course_id,
+        "modules": [],
+        "video_data": [],
+        "messages": [],
+        "questions_inserted": []
+    }
+
+    # Step 1-2: Modules and lessons in one joined query; the connection is released before media work
+    with job.stage("inventory"):
+        manifest = LessonManifest.load(course_id)
+        module_ids = manifest.module_ids
+        print(f"📦 Found Module IDs: {module_ids}")
+
+        if not module_ids:
+            raise ValueError("⚠️ No modules found for this course.")
+
+        result["messages"].append(f"📦 Found {len(module_ids)} modules.")
+        result["modules"] = manifest.to_dict()["modules"]
+        video_data = manifest.media_items()
+        result["video_data"] = video_data
+
+    # Step 3: Generate transcripts and captions from a single Whisper pass per lesson
+    with job.stage("transcripts"):
+        print(f"🎯 Total videos to transcribe: {len(video_data)}")
+        transcript_stats = generate_transcripts(video_data, module_transcripts_folder,
+                                                caption_folder='../uploads/captions',
+                                                progress=job.progress_callback("transcripts"))
+        result["transcript_cache"] = {
+            "hits": transcript_stats["cache_hits"],
+            "misses": transcript_stats["cache_misses"]
+        }
+        result["transcript_errors"] = transcript_stats["failed"]
+        if transcript_stats["errors"]:
+            message = f"{transcript_stats['errors']} of {transcript_stats['lessons']} lesson(s) failed to transcribe"
+            if transcript_stats["errors"] == transcript_stats["lessons"]:
+                raise Exception(f"⚠️ {message}.")
+            result["messages"].append(f"⚠️ {message}.")
+            job.partial("transcripts", message)
+
+        # Refresh the chat retrieval index while the transcripts are fresh
+        for module_id in module_ids:
+            try:
+                transcript_index.sync(module_id)
+            except Exception as e:
+                print(f"⚠️ Could not index transcript for module {module_id}: {e}")
+
+    # Step 4: Generate summaries after transcripts
+    print(f"📝 Generating summaries for transcripts...")
+    os.makedirs(video_summaries_folder, exist_ok=True)
+    os.makedirs(module_summaries_folder, exist_ok=True)
+
+    # Summarize video transcripts; new summaries are saved to their lessons in one batch
+    with job.stage("video_summaries"):
+        video_summary_result = summarize_folder(video_transcripts_folder, video_summaries_folder, True,
+                                                lesson_ids=manifest.lesson_ids_by_video(),
+                                                progress=job.progress_callback("video_summaries"))
+        if video_summary_result["failed"]:
+            message = f"Video summaries failed for: {', '.join(video_summary_result['failed'])}"
+            result["messages"].append(f"⚠️ {message}")
+            job.partial("video_summaries", message)
+        lesson_updates = video_summary_result["lessons"]
+        result["lesson_summaries"] = lesson_updates
+        if lesson_updates:
+            result["messages"].append(
+                f"📝 Lesson summaries updated: {lesson_updates['matched']} matched, {lesson_updates['unmatched']} unmatched."
+            )
+
+    # Summarize module transcripts
+    with job.stage("module_summaries"):
+        module_summary_result = summarize_folder(module_transcripts_folder, module_summaries_folder, False,
+                                                 progress=job.progress_callback("module_summaries"))
+        if module_summary_result["failed"]:
+            message = f"Module summaries failed for: {', '.join(module_summary_result['failed'])}"
+            result["messages"].append(f"⚠️ {message}")
+            job.partial("module_summaries", message)
+
+        # Cached chat answers were based on the old content
+        for module_id in module_ids:
+            chat_cache.invalidate(module_id)
+
+    # Step 5: Generate questions for this course's modules whose questions are missing or out of date
+    with job.stage("questions"):
+        print(f"🔎 Checking for generated questions...")
+        folder_path = generated_questions_folder
+        result["mcq_stats"] = None
+        os.makedirs(folder_path, exist_ok=True)
+
+        stale = []
+        for module_id in module_ids:
+            transcript_hash = file_source_hash(os.path.join(module_transcripts_folder, f"module{module_id}_transcript.txt"))
+            questions_path = os.path.join(folder_path, f"module{module_id}_transcript_questions.json")
+            if transcript_hash is not None and not is_current(questions_path, transcript_hash):
+                stale.append(module_id)
+        if stale:
+            print(f"📂 Questions missing or out of date for module(s) {stale}. Generating MCQs from transcripts...")
+            result["mcq_stats"] = generate_all_questions_from_transcripts_folder(
+                module_transcripts_folder, folder_path, progress=job.progress_callback("questions"),
+                file_names={f"module{module_id}_transcript.txt" for module_id in stale}
+            )
+
+        json_files = [f for f in os.listdir(folder_path) if f.endswith(".json")]
+        if not json_files:
+            raise Exception("⚠️ No generated MCQ files found even after generation!")
+
+    # Step 6: Insert every file's questions into the database in one transaction
+    with job.stage("insert"):
+        # Each file names its module; files for modules outside this course are skipped
+        course_modules = set(module_ids)
+        assignments = []
+        for json_file in sorted(json_files):
+            module_id = question_file_module_id(json_file)
+            if module_id is None:
+                print(f"⚠️ No module ID in file name {json_file}")
+                continue
+            if module_id not in course_modules:
+                print(f"⏩ Skipping {json_file}: module {module_id} is not part of course {course_id}")
+                continue
+
+            full_path = os.path.join(folder_path, json_file)
+            print("full path  -------------------", full_path)
+            assignments.append((full_path, [module_id]))
+
+        if not assignments:
+            raise Exception("⚠️ None of the generated MCQ files belong to this course's modules.")
+
+        insertion_result = insert_course_questions(assignments, course_id=course_id, upsert=upsert)
+        result["messages"].extend(insertion_result["messages"])
+        if not insertion_result["success"]:
+            raise Exception(insertion_result["messages"][-1] if insertion_result["messages"] else "Question insertion failed")
+
+        for full_path, (module_id,) in assignments:
+            counts = insertion_result["per_module"].get(module_id, {"inserted": 0, "updated": 0})
+            result["questions_inserted"].append({
+                "module_id": module_id,
+                "file": os.path.basename(full_path),
+                "inserted": counts["inserted"],
+                "updated": counts["updated"],
+                "status": "Inserted Successfully"
+            })
+
+    result["message"] = "✅ Questions inserted, transcripts and summaries generated."
+    return result
@@ -0,0 +1,168 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import pool as pg_pool
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+# Connections kept open / allowed at once by this process
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# How long a caller waits for a free connection before giving up
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Connections idle longer than this are checked with SELECT 1 before being handed out
+DB_POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "30"))
+
+
+class PoolTimeout(pg_pool.PoolError):
+    """Raised when no pooled connection frees up within DB_POOL_TIMEOUT."""
+
+
+class ConnectionPool:
+    """
+    Process-wide pool of PostgreSQL connections on top of psycopg2's
+    ThreadedConnectionPool. Callers that find every connection checked out
+    wait (up to `timeout`) instead of failing with PoolError.
+
+    A returned connection is reset before reuse: an open transaction is rolled
+    back and autocommit is switched back off. Connections that are closed or
+    that raised a connection-level error are discarded instead, and on
+    checkout a connection that is closed, in a bad state or (after sitting
+    idle for ping_after seconds) fails SELECT 1 is discarded and replaced.
+    The pool itself is created on first use, so importing this module never
+    touches the database.
+    """
+
+    def __init__(self, dsn=DATABASE_URL, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT,
+                 ping_after=DB_POOL_PING_AFTER):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.pool = None
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(maxconn)
+        # id(conn) -> when it was last returned, for deciding whether to ping it
+        self.idle_since = {}
+        self.metrics = {"checkouts": 0, "waits": 0, "wait_seconds": 0.0, "timeouts": 0, "discarded": 0,
+                        "in_use": 0, "max_in_use": 0}
+
+    def get_pool(self):
+        with self.lock:
+            if self.pool is None:
+                self.pool = pg_pool.ThreadedConnectionPool(self.minconn, self.maxconn, self.dsn)
+                print(f"🔌 Opened database pool ({self.minconn}-{self.maxconn} connections)")
+            return self.pool
+
+    @contextmanager
+    def connection(self):
+        """
+        Check a connection out for the duration of a `with` block. Commit
+        explicitly; anything left uncommitted is rolled back on return.
+        """
+        pool = self.get_pool()
+
+        started = time.monotonic()
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.metrics["waits"] += 1
+            if not self.slots.acquire(timeout=self.timeout):
+                with self.lock:
+                    self.metrics["timeouts"] += 1
+                raise PoolTimeout(f"No database connection free after {self.timeout:.0f}s")
+        waited = time.monotonic() - started
+
+        conn = None
+        broken = False
+        try:
+            conn = self.checkout(pool)
+
+            with self.lock:
+                self.metrics["checkouts"] += 1
+                self.metrics["wait_seconds"] += waited
+                self.metrics["in_use"] += 1
+                self.metrics["max_in_use"] = max(self.metrics["max_in_use"], self.metrics["in_use"])
+
+            try:
+                yield conn
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                broken = True
+                raise
+        finally:
+            if conn is not None:
+                self.release(pool, conn, broken)
+            self.slots.release()
+
+    def checkout(self, pool):
+        """A live connection from the pool; dead ones are closed and replaced."""
+        for _ in range(self.maxconn + 1):
+            conn = pool.getconn()
+            if self.alive(conn):
+                return conn
+            print("⚠️ Discarding a dead database connection")
+            with self.lock:
+                self.metrics["discarded"] += 1
+            pool.putconn(conn, close=True)
+        raise psycopg2.OperationalError("No live database connection could be opened")
+
+    def alive(self, conn):
+        with self.lock:
+            idle_since = self.idle_since.pop(id(conn), None)
+        if conn.closed or conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if idle_since is None or time.monotonic() - idle_since < self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def release(self, pool, conn, broken):
+        with self.lock:
+            self.metrics["in_use"] -= 1
+
+        discard = broken or conn.closed
+        if not discard:
+            try:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except psycopg2.Error:
+                discard = True
+
+        with self.lock:
+            if discard:
+                self.metrics["discarded"] += 1
+            else:
+                self.idle_since[id(conn)] = time.monotonic()
+        pool.putconn(conn, close=discard)
+
+    def stats(self):
+        """Counters kept by this wrapper; psycopg2's pool internals are not read."""
+        with self.lock:
+            stats = dict(self.metrics, min=self.minconn, max=self.maxconn)
+            stats["available"] = self.maxconn - stats["in_use"]
+            stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+            return stats
+
+
+db_pool = ConnectionPool()
+
+
+def connection():
+    """Context-managed connection from the shared pool: `with connection() as conn:`."""
+    return db_pool.connection()
+
+
+def get_stats():
+    """Pool size, utilisation and wait/timeout counters (see /api/db/stats)."""
+    return db_pool.stats()
@@ -0,0 +1,7 @@
+import os
+from sentence_transformers import SentenceTransformer
+
+# Sentence embedding model shared by the recommender, transcript retrieval and the chat cache
+EMBEDDING_MODEL_PATH = os.getenv("EMBEDDING_MODEL_PATH", "./all-MiniLM-L6-v2")
+
+model = SentenceTransformer(EMBEDDING_MODEL_PATH)  # efficient model
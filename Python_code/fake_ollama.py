@@ -0,0 +1,92 @@
+import json
+import time
+import random
+import argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Minimal stand-in for an Ollama server, for exercising llm_client routing locally.
+# Run e.g.:
+#   python fake_ollama.py --port 11501 --models llama3.3:latest --delay 0.5
+#   python fake_ollama.py --port 11502 --models llama3.3:latest,gemma3:27b --fail-rate 0.2
+# then point OLLAMA_HOSTS=http://localhost:11501,http://localhost:11502 at them.
+
+
+def make_handler(models, delay, fail_rate):
+    class FakeOllamaHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive plus chunked streaming
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                self.send_json(200, {"models": [{"name": name} for name in models]})
+            else:
+                self.send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/api/generate":
+                return self.send_json(404, {"error": "not found"})
+
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if body.get("model") not in models:
+                return self.send_json(404, {"error": f"model '{body.get('model')}' not found"})
+            if random.random() < fail_rate:
+                return self.send_json(503, {"error": "server busy"})
+
+            text = f"[fake {body['model']} on port {self.server.server_port}] {body.get('prompt', '')[-80:]}"
+            # Stand-in token ids: the previous context plus one id per word of this exchange
+            context = list(body.get("context") or []) + list(range(len((body.get("prompt", "") + " " + text).split())))
+            if body.get("stream", True):
+                return self.send_stream(body["model"], text, delay, context)
+
+            time.sleep(delay)
+            self.send_json(200, {"model": body["model"], "response": text, "done": True, "context": context})
+
+        def send_stream(self, model, text, delay, context):
+            # NDJSON like Ollama: the delay goes before the first token, then words trickle out
+            words = text.split(" ")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            time.sleep(delay)
+            for i, word in enumerate(words):
+                chunk = {"model": model, "response": word if i == 0 else " " + word, "done": False}
+                self.write_chunk(json.dumps(chunk) + "\n")
+                time.sleep(0.01)
+            self.write_chunk(json.dumps({"model": model, "response": "", "done": True, "context": context}) + "\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def write_chunk(self, line):
+            data = line.encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+    return FakeOllamaHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server for local testing")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--models", default="llama3.3:latest,gemma3:27b")
+    parser.add_argument("--delay", type=float, default=0.2, help="seconds per generate call")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of calls answered with 503")
+    args = parser.parse_args()
+
+    models = [name.strip() for name in args.models.split(",") if name.strip()]
+    server = ThreadingHTTPServer(("0.0.0.0", args.port), make_handler(models, args.delay, args.fail_rate))
+    print(f"🧪 Fake Ollama on :{args.port} serving {models}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
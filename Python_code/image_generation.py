@@ -5,11 +5,9 @@ from google import genai
 from google.genai import types
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import psycopg2
 from dotenv import load_dotenv
 
 load_dotenv()
-db_url = os.getenv("DATABASE_URL")
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -74,23 +72,21 @@ def generate_course_image(course_id: int, course_title: str, course_description:
                     saved_paths.append(save_path)
                     result["saved_path"] = save_path
                     print(f"✅ Image saved at: {save_path}")
-                    conn = psycopg2.connect(db_url)
-                    cursor = conn.cursor()
-
                     relative_path = os.path.relpath(save_path, start='C:/github/LearningLabs')
                     url_path = relative_path.replace('\\', '/')  # ensure forward slashes
                     thumbnail_url = f"http://localhost:5000/{url_path}"
 
-                    # update_query = "UPDATE courses SET thumbnail = %s WHERE id = %s"
-                    # cursor.execute(update_query, (thumbnail_url, course_id))
-                    # conn.commit()
+                    # from db import connection
+                    # with connection() as conn, conn.cursor() as cursor:
+                    #     update_query = "UPDATE courses SET thumbnail = %s WHERE id = %s"
+                    #     cursor.execute(update_query, (thumbnail_url, course_id))
+                    #     conn.commit()
 
                     print(f"📝 Thumbnail updated for course ID {course_id}")
 
                 except UnidentifiedImageError as e:
                     print(f"❌ Unidentified image data: {e}")
                     continue  # Skip non-image inline data
-    conn.close()
 
     if not result["saved_path"]:
         raise RuntimeError("Image generation failed: No valid image returned by the model.")
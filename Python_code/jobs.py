@@ -0,0 +1,185 @@
+import os
+import time
+import uuid
+import threading
+import traceback
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# Course ingests run one at a time; the rest wait in the queue. Every ingest reads
+# and writes the same working folders (module_transcripts, video_summaries,
+# module_summaries, generated_questions), so two at once would pick up each
+# other's files and could insert one course's questions under another.
+INGEST_WORKERS = 1
+if os.getenv("INGEST_WORKERS", "1") != "1":
+    print("⚠️ INGEST_WORKERS is ignored: course ingests share working folders and run one at a time")
+# Jobs allowed to wait for a worker before new submissions are refused
+INGEST_MAX_QUEUED = int(os.getenv("INGEST_MAX_QUEUED", "20"))
+# Finished jobs kept for the status endpoint
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "200"))
+
+
+class QueueFull(Exception):
+    """Raised when a job queue already has max_queued jobs waiting."""
+
+
+def elapsed(started, finished):
+    if started is None:
+        return None
+    return round((finished or time.time()) - started, 3)
+
+
+class Job:
+    """
+    One unit of background work with named stages. The worker function
+    reports through stage() and progress(); status() is a JSON-ready snapshot.
+    """
+
+    def __init__(self, kind, key=None, params=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.params = params or {}
+        self.lock = threading.Lock()
+        self.state = "queued"
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.stages = OrderedDict()
+        self.result = None
+        self.error = None
+
+    @property
+    def active(self):
+        return self.state in ("queued", "running")
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time a pipeline stage; an exception marks it failed and propagates. A
+        stage flagged with partial() finishes as "partial" instead of "succeeded".
+        """
+        with self.lock:
+            stage = self.stages.setdefault(name, {"state": "pending", "done": None, "total": None})
+            stage.update(state="running", started=time.time(), finished=None, error=None)
+        print(f"▶️ Job {self.id[:8]} ({self.kind}): {name}")
+        try:
+            yield
+        except Exception as e:
+            with self.lock:
+                stage.update(state="failed", finished=time.time(), error=str(e))
+            raise
+        with self.lock:
+            stage.update(state="partial" if stage["error"] else "succeeded", finished=time.time())
+
+    def partial(self, name, error):
+        """Record errors in a running stage that still lets the job continue."""
+        with self.lock:
+            self.stages[name]["error"] = error
+
+    def progress(self, name, done, total):
+        with self.lock:
+            stage = self.stages.setdefault(name, {"state": "running", "started": time.time()})
+            stage.update(done=done, total=total)
+
+    def progress_callback(self, name):
+        return lambda done, total: self.progress(name, done, total)
+
+    def status(self):
+        with self.lock:
+            return {
+                "job_id": self.id,
+                "kind": self.kind,
+                "key": self.key,
+                "params": self.params,
+                "state": self.state,
+                "created": self.created,
+                "queued_seconds": round((self.started or time.time()) - self.created, 3),
+                "run_seconds": elapsed(self.started, self.finished),
+                "stages": [
+                    {
+                        "name": name,
+                        "state": stage["state"],
+                        "done": stage.get("done"),
+                        "total": stage.get("total"),
+                        "seconds": elapsed(stage.get("started"), stage.get("finished")),
+                        "error": stage.get("error"),
+                    }
+                    for name, stage in self.stages.items()
+                ],
+                "result": self.result,
+                "error": self.error,
+            }
+
+
+class JobQueue:
+    """
+    In-process background jobs on a bounded thread pool. At most max_workers
+    jobs run at once and at most max_queued wait; a job submitted with the key
+    of one still queued or running (e.g. the same course) returns that job
+    instead of starting a duplicate.
+    """
+
+    def __init__(self, name, max_workers=INGEST_WORKERS, max_queued=INGEST_MAX_QUEUED, history=JOB_HISTORY):
+        self.name = name
+        self.max_queued = max_queued
+        self.history = history
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-job")
+        self.lock = threading.Lock()
+        self.jobs = OrderedDict()
+
+    def submit(self, kind, fn, key=None, params=None):
+        """
+        Queue fn(job) and return (job, created). created is False when an
+        active job with the same key already exists.
+        """
+        with self.lock:
+            if key is not None:
+                for job in self.jobs.values():
+                    if job.key == key and job.active:
+                        return job, False
+
+            queued = sum(1 for job in self.jobs.values() if job.state == "queued")
+            if queued >= self.max_queued:
+                raise QueueFull(f"{self.name} queue already has {queued} jobs waiting")
+
+            job = Job(kind, key, params)
+            self.jobs[job.id] = job
+            self.trim()
+
+        self.pool.submit(self.run, job, fn)
+        return job, True
+
+    def run(self, job, fn):
+        with job.lock:
+            job.state = "running"
+            job.started = time.time()
+        try:
+            result = fn(job)
+            with job.lock:
+                job.result = result
+                job.state = "succeeded"
+        except Exception as e:
+            traceback.print_exc()
+            with job.lock:
+                job.error = str(e)
+                job.state = "failed"
+        finally:
+            with job.lock:
+                job.finished = time.time()
+            print(f"🏁 Job {job.id[:8]} ({job.kind}) {job.state} in {elapsed(job.started, job.finished)}s")
+
+    def trim(self):
+        finished = [job_id for job_id, job in self.jobs.items() if not job.active]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def statuses(self):
+        with self.lock:
+            jobs = list(self.jobs.values())
+        return [job.status() for job in reversed(jobs)]
@@ -0,0 +1,76 @@
+from summary_generator import video_key
+from db import connection
+
+
+class LessonManifest:
+    """
+    A course's modules and lessons in teaching order, loaded with one joined
+    query. Later pipeline stages (transcription, summaries, question
+    insertion) read from this instead of going back to the database.
+    """
+
+    def __init__(self, course_id, modules):
+        self.course_id = course_id
+        # [{"module_id", "title", "position", "lessons": [{"lesson_id", "title", "type", "path", "position"}]}]
+        self.modules = modules
+
+    @classmethod
+    def load(cls, course_id):
+        """Fetch the inventory and return the connection to the pool before any media work starts."""
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT m.id, m.title, m.position, l.id, l.title, l.type, l.video_url, l.position
+                FROM modules m
+                LEFT JOIN lessons l ON l.module_id = m.id
+                WHERE m.course_id = %s
+                ORDER BY m.position, m.id, l.position, l.id
+            """, (course_id,))
+            rows = cur.fetchall()
+
+        modules = {}
+        for module_id, module_title, module_position, lesson_id, title, lesson_type, video_url, position in rows:
+            module = modules.setdefault(module_id, {
+                "module_id": module_id,
+                "title": module_title,
+                "position": module_position,
+                "lessons": []
+            })
+            if lesson_id is not None:
+                module["lessons"].append({
+                    "lesson_id": lesson_id,
+                    "title": title,
+                    "type": lesson_type,
+                    "path": video_url,
+                    "position": position
+                })
+        return cls(course_id, list(modules.values()))
+
+    @property
+    def module_ids(self):
+        return [module["module_id"] for module in self.modules]
+
+    def media_items(self):
+        """Lessons with a media file, in the shape generate_transcripts expects."""
+        return [
+            {"module_id": module["module_id"], "lesson_id": lesson["lesson_id"],
+             "path": lesson["path"], "position": lesson["position"]}
+            for module in self.modules
+            for lesson in module["lessons"]
+            if lesson["path"]
+        ]
+
+    def lesson_ids_by_video(self):
+        """video key -> lesson id, for saving video summaries (see summary_generator.video_key)."""
+        return {video_key(item["path"]): item["lesson_id"] for item in self.media_items()}
+
+    def to_dict(self):
+        return {
+            "course_id": self.course_id,
+            "modules": [
+                {"module_id": module["module_id"], "videos": [
+                    {"lesson_id": lesson["lesson_id"], "path": lesson["path"], "position": lesson["position"]}
+                    for lesson in module["lessons"]
+                ]}
+                for module in self.modules
+            ]
+        }
@@ -0,0 +1,357 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Endpoints and models per workload; override via environment
+LLM_BACKENDS = {
+    "chat": {
+        "url": os.getenv("OLLAMA_CHAT_URL", "http://192.168.0.65:11434"),
+        "model": os.getenv("OLLAMA_CHAT_MODEL", "gemma3:27b"),
+        "max_concurrency": int(os.getenv("OLLAMA_CHAT_CONCURRENCY", "4")),
+    },
+    "summary": {
+        "url": os.getenv("OLLAMA_SUMMARY_URL", "http://192.168.13.28:11434"),
+        "model": os.getenv("OLLAMA_SUMMARY_MODEL", "llama3.3:latest"),
+        "max_concurrency": int(os.getenv("OLLAMA_SUMMARY_CONCURRENCY", "4")),
+    },
+    "mcq": {
+        "url": os.getenv("OLLAMA_MCQ_URL", os.getenv("OLLAMA_SUMMARY_URL", "http://192.168.13.28:11434")),
+        "model": os.getenv("OLLAMA_MCQ_MODEL", "llama3.3:latest"),
+        "max_concurrency": int(os.getenv("OLLAMA_MCQ_CONCURRENCY", "4")),
+    },
+}
+
+# Every Ollama host any workload may be routed to (the backend URLs are always included)
+OLLAMA_HOSTS = [url.strip().rstrip("/") for url in os.getenv("OLLAMA_HOSTS", "").split(",") if url.strip()]
+
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "600"))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "3"))
+LLM_BACKOFF_SECONDS = float(os.getenv("LLM_BACKOFF_SECONDS", "1"))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "16"))
+
+# Health checking and circuit breaking for the host pool
+LLM_HEALTH_INTERVAL = float(os.getenv("LLM_HEALTH_INTERVAL", "15"))
+LLM_CIRCUIT_FAILURES = int(os.getenv("LLM_CIRCUIT_FAILURES", "3"))
+LLM_CIRCUIT_COOLDOWN = float(os.getenv("LLM_CIRCUIT_COOLDOWN", "30"))
+
+# Responses worth retrying: the server is overloaded or restarting
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Raised when an LLM backend cannot produce a response after retries."""
+
+
+# One keep-alive session shared by every caller in the process
+session = requests.Session()
+adapter = HTTPAdapter(pool_connections=max(1, len(OLLAMA_HOSTS) + len(LLM_BACKENDS)), pool_maxsize=LLM_POOL_SIZE)
+session.mount("http://", adapter)
+session.mount("https://", adapter)
+
+semaphores = {
+    name: threading.BoundedSemaphore(backend["max_concurrency"])
+    for name, backend in LLM_BACKENDS.items()
+}
+
+
+class OllamaHost:
+    """Routing state for one Ollama server: load, health, circuit and latency stats."""
+
+    def __init__(self, url):
+        self.url = url
+        self.lock = threading.Lock()
+        self.models = None  # unknown until the first health check
+        self.healthy = True
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.circuit_open_until = 0.0
+        self.latency_ewma = None
+        self.latencies = deque(maxlen=200)
+
+    def available(self, now):
+        return self.healthy and now >= self.circuit_open_until
+
+    def serves(self, model):
+        return self.models is None or model in self.models
+
+    def record_success(self, seconds):
+        with self.lock:
+            self.requests += 1
+            self.consecutive_failures = 0
+            self.circuit_open_until = 0.0
+            self.latencies.append(seconds)
+            self.latency_ewma = seconds if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * seconds
+
+    def record_failure(self):
+        with self.lock:
+            self.requests += 1
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= LLM_CIRCUIT_FAILURES:
+                self.circuit_open_until = time.monotonic() + LLM_CIRCUIT_COOLDOWN
+                print(f"🚫 Circuit opened for {self.url} after {self.consecutive_failures} failures")
+
+    def stats(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            percentile = lambda p: round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3) if latencies else None
+            return {
+                "url": self.url,
+                "healthy": self.healthy,
+                "circuit_open": time.monotonic() < self.circuit_open_until,
+                "models": sorted(self.models) if self.models is not None else None,
+                "outstanding": self.outstanding,
+                "requests": self.requests,
+                "failures": self.failures,
+                "latency_ewma_s": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+                "latency_p50_s": percentile(0.5),
+                "latency_p95_s": percentile(0.95),
+            }
+
+
+class HostPool:
+    """
+    Routes generate calls to the least-loaded healthy host serving the model.
+    Hosts are polled via /api/tags in a background thread, which both refreshes
+    the model list and closes circuits on hosts that have recovered.
+    """
+
+    def __init__(self, urls):
+        self.hosts = {url: OllamaHost(url) for url in dict.fromkeys(urls)}
+        self.lock = threading.Lock()
+        self.health_thread = None
+
+    def start_health_checks(self):
+        with self.lock:
+            if self.health_thread is None and LLM_HEALTH_INTERVAL > 0:
+                self.health_thread = threading.Thread(target=self.health_loop, name="ollama-health", daemon=True)
+                self.health_thread.start()
+
+    def health_loop(self):
+        while True:
+            self.check_health()
+            time.sleep(LLM_HEALTH_INTERVAL)
+
+    def check_health(self):
+        for host in self.hosts.values():
+            try:
+                response = session.get(f"{host.url}/api/tags", timeout=(LLM_CONNECT_TIMEOUT, LLM_CONNECT_TIMEOUT))
+                response.raise_for_status()
+                models = {entry["name"] for entry in response.json().get("models", [])}
+                with host.lock:
+                    if not host.healthy:
+                        print(f"💚 Ollama host back online: {host.url}")
+                    host.models = models
+                    # Only reachability; an open circuit closes on cooldown expiry or a successful generate
+                    host.healthy = True
+            except Exception as e:
+                with host.lock:
+                    if host.healthy:
+                        print(f"💔 Ollama host failed health check: {host.url} ({e})")
+                    host.healthy = False
+
+    def acquire(self, model, fallback_url, exclude=()):
+        """
+        Pick a host for `model` and count the request as outstanding on it.
+        Hosts in `exclude` (already failed this call) are never picked; raises
+        LLMError when no other host is left.
+        """
+        now = time.monotonic()
+        with self.lock:
+            candidates = [
+                host for host in self.hosts.values()
+                if host.url not in exclude and host.available(now) and host.serves(model)
+            ]
+            # Hosts known to serve the model beat hosts whose model list hasn't been fetched yet
+            known = [host for host in candidates if host.models is not None]
+            if known:
+                candidates = known
+            elif fallback_url not in exclude and any(host.url == fallback_url for host in candidates):
+                candidates = [self.hosts[fallback_url]]
+            if not candidates and fallback_url not in exclude:
+                # Nothing healthy advertises the model; try the configured host anyway
+                candidates = [self.hosts[fallback_url]]
+            if not candidates:
+                # Last resort: whichever untried host's circuit reopens soonest
+                remaining = [host for host in self.hosts.values() if host.url not in exclude]
+                if not remaining:
+                    raise LLMError(f"No Ollama host left to try for {model} (failed: {', '.join(sorted(exclude))})")
+                candidates = [min(remaining, key=lambda h: h.circuit_open_until)]
+
+            host = min(candidates, key=lambda h: (h.outstanding, h.latency_ewma or 0.0))
+            host.outstanding += 1
+            return host
+
+    def release(self, host):
+        with self.lock:
+            host.outstanding -= 1
+
+    def stats(self):
+        return [host.stats() for host in self.hosts.values()]
+
+
+host_pool = HostPool(OLLAMA_HOSTS + [backend["url"].rstrip("/") for backend in LLM_BACKENDS.values()])
+
+
+def generate(backend, prompt, model=None, **options):
+    """
+    POST /api/generate for the named backend and return the decoded JSON body.
+    Each attempt goes to the least-loaded healthy host that serves the model;
+    connection errors and overload responses are retried on another host with
+    exponential backoff. The number of in-flight requests per backend is capped.
+    """
+    config = LLM_BACKENDS[backend]
+    payload = {"model": model or config["model"], "prompt": prompt, "stream": False}
+    payload.update(options)
+    host_pool.start_health_checks()
+
+    last_error = None
+    failed_hosts = set()
+    for attempt in range(LLM_RETRIES + 1):
+        if attempt:
+            delay = LLM_BACKOFF_SECONDS * (2 ** (attempt - 1))
+            print(f"🔁 Retrying {backend} LLM call in {delay:.1f}s (attempt {attempt + 1}): {last_error}")
+            time.sleep(delay)
+
+        with semaphores[backend]:
+            host = host_pool.acquire(payload["model"], config["url"].rstrip("/"), exclude=failed_hosts)
+            started = time.monotonic()
+            try:
+                response = session.post(
+                    f"{host.url}/api/generate",
+                    json=payload,
+                    timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT)
+                )
+            except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+                host.record_failure()
+                failed_hosts.add(host.url)
+                last_error = f"{host.url}: {e}"
+                continue
+            except requests.Timeout as e:
+                # A read timeout means the model is busy generating; don't pile on more work
+                host.record_failure()
+                raise LLMError(f"{backend} LLM timed out on {host.url}: {e}") from e
+            finally:
+                host_pool.release(host)
+
+        if response.status_code == 404:
+            # Host doesn't have this model (model list not known yet or stale); try another
+            failed_hosts.add(host.url)
+            last_error = f"{host.url}: model {payload['model']} not found"
+            continue
+        if response.status_code in RETRY_STATUSES:
+            host.record_failure()
+            failed_hosts.add(host.url)
+            last_error = f"{host.url}: HTTP {response.status_code}"
+            continue
+        if response.status_code != 200:
+            host.record_failure()
+            raise LLMError(f"{backend} LLM returned {response.status_code} from {host.url}: {response.text}")
+
+        host.record_success(time.monotonic() - started)
+        return response.json()
+
+    raise LLMError(f"{backend} LLM failed after {LLM_RETRIES + 1} attempts: {last_error}")
+
+
+def generate_stream(backend, prompt, model=None, **options):
+    """
+    Streaming POST /api/generate: yields each decoded NDJSON chunk as Ollama
+    produces it. Host selection and retries work as in generate(), but only
+    until the first chunk arrives; once tokens have been handed to the caller a
+    failure raises LLMError instead of silently restarting the answer.
+    """
+    config = LLM_BACKENDS[backend]
+    payload = {"model": model or config["model"], "prompt": prompt, "stream": True}
+    payload.update(options)
+    host_pool.start_health_checks()
+
+    last_error = None
+    failed_hosts = set()
+    for attempt in range(LLM_RETRIES + 1):
+        if attempt:
+            delay = LLM_BACKOFF_SECONDS * (2 ** (attempt - 1))
+            print(f"🔁 Retrying {backend} LLM stream in {delay:.1f}s (attempt {attempt + 1}): {last_error}")
+            time.sleep(delay)
+
+        with semaphores[backend]:
+            host = host_pool.acquire(payload["model"], config["url"].rstrip("/"), exclude=failed_hosts)
+            started = time.monotonic()
+            streamed = False
+            try:
+                try:
+                    response = session.post(
+                        f"{host.url}/api/generate",
+                        json=payload,
+                        stream=True,
+                        timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT)
+                    )
+                except requests.ConnectionError as e:
+                    host.record_failure()
+                    failed_hosts.add(host.url)
+                    last_error = f"{host.url}: {e}"
+                    continue
+                except requests.Timeout as e:
+                    host.record_failure()
+                    raise LLMError(f"{backend} LLM timed out on {host.url}: {e}") from e
+
+                with response:
+                    if response.status_code == 404:
+                        failed_hosts.add(host.url)
+                        last_error = f"{host.url}: model {payload['model']} not found"
+                        continue
+                    if response.status_code in RETRY_STATUSES:
+                        host.record_failure()
+                        failed_hosts.add(host.url)
+                        last_error = f"{host.url}: HTTP {response.status_code}"
+                        continue
+                    if response.status_code != 200:
+                        host.record_failure()
+                        raise LLMError(f"{backend} LLM returned {response.status_code} from {host.url}: {response.text}")
+
+                    try:
+                        for line in response.iter_lines():
+                            if not line:
+                                continue
+                            chunk = json.loads(line)
+                            if chunk.get("error"):
+                                raise LLMError(f"{backend} LLM stream error from {host.url}: {chunk['error']}")
+                            streamed = True
+                            yield chunk
+                            if chunk.get("done"):
+                                break
+                    except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError, requests.Timeout) as e:
+                        host.record_failure()
+                        if streamed:
+                            raise LLMError(f"{backend} LLM stream from {host.url} broke off: {e}") from e
+                        failed_hosts.add(host.url)
+                        last_error = f"{host.url}: {e}"
+                        continue
+
+                host.record_success(time.monotonic() - started)
+                return
+            finally:
+                host_pool.release(host)
+
+    raise LLMError(f"{backend} LLM stream failed after {LLM_RETRIES + 1} attempts: {last_error}")
+
+
+async def agenerate(backend, prompt, model=None, **options):
+    """asyncio wrapper around generate(); runs on the default thread pool."""
+    return await asyncio.to_thread(generate, backend, prompt, model, **options)
+
+
+def get_stats():
+    """Per-host routing stats for inspection (see /api/llm/stats)."""
+    return {"hosts": host_pool.stats()}
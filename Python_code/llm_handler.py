@@ -1,33 +1,101 @@
-import requests
 import os
+import time
+from llm_client import generate, generate_stream
+from token_budget import truncate_to_tokens
+from transcript_index import TranscriptChunkIndex
+from chat_cache import SemanticChatCache
+from chat_state import ConversationStore, budget_history
+from embeddings import model as embedding_model, EMBEDDING_MODEL_PATH
+
+# Upper bound on the module context placed in a chat prompt
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "1500"))
+# How many transcript chunks may be retrieved for one question
+CHAT_TOP_K = int(os.getenv("CHAT_TOP_K", "6"))
+
+# Per-module transcript chunks, embedded with the same MiniLM model as the recommender
+transcript_index = TranscriptChunkIndex(embedding_model, model_name=EMBEDDING_MODEL_PATH)
+# Answers to near-identical questions per module; see chat_cache.SemanticChatCache
+chat_cache = SemanticChatCache(embedding_model)
+
+# Reuse Ollama's returned `context` between turns and keep the chat model loaded
+CHAT_REUSE_CONTEXT = os.getenv("CHAT_REUSE_CONTEXT", "1") == "1"
+CHAT_KEEP_ALIVE = os.getenv("CHAT_KEEP_ALIVE", "30m")
+# Shown when the LLM returns no answer text (never cached or remembered)
+NO_ANSWER = "Sorry, no answer found."
+conversation_store = ConversationStore()
 
 def get_module_summary(module_id):
-    """Fetch summary from module_summaries/module<id>_summary.txt"""
+    """Fetch summary from module_summaries/module<id>_summary.txt, capped at CHAT_CONTEXT_TOKENS"""
     try:
         filename = f"module_summaries/module{module_id}_summary.txt"
         with open(filename, "r", encoding="utf-8") as file:
-            return file.read()
+            return truncate_to_tokens(file.read(), CHAT_CONTEXT_TOKENS)
     except FileNotFoundError:
         print(f"⚠️ Summary file not found for module_id: {module_id}")
         return ""
 
 
-def chat(question, module_id="", history=[]):
+def get_module_context(module_id, question, question_vector=None, skip_rows=None):
     """
-    Sends a chat request to the LLM server and returns the response.
+    Transcript chunks relevant to the question, in lesson order, within
+    CHAT_CONTEXT_TOKENS, as (text, chunk rows). Falls back to the module
+    summary, with rows None, when the module has no indexed transcript.
+    Chunks in skip_rows were already sent earlier in the conversation.
+    """
+    if module_id != "":
+        try:
+            chunks = transcript_index.search(module_id, question, CHAT_TOP_K, CHAT_CONTEXT_TOKENS,
+                                            query=question_vector)
+            if chunks:
+                chunks.sort(key=lambda chunk: chunk["row"])
+                rows = {chunk["row"] for chunk in chunks}
+                text = "\n\n".join(
+                    f"[{chunk['lesson']}] {chunk['text']}" if chunk["lesson"] else chunk["text"]
+                    for chunk in chunks if chunk["row"] not in (skip_rows or ())
+                )
+                return text, rows
+        except Exception as e:
+            print(f"⚠️ Transcript retrieval failed for module {module_id}, using summary: {e}")
+
+    return get_module_summary(module_id), None
+
+
+def build_chat_prompt(question, module_id="", history=[], question_vector=None):
     """
+    Builds the chat prompt and Ollama options for this turn, plus the set of
+    transcript chunks the conversation has now seen.
+
+    When the previous turn's Ollama context is still known, only the new
+    question (and context chunks not sent before) is added on top of it, so
+    the system prompt and earlier turns are not evaluated again. Otherwise
+    the full prompt is built with history cut down to CHAT_HISTORY_TOKENS.
+    """
+    options = {"keep_alive": CHAT_KEEP_ALIVE}
+
+    state = conversation_store.get(module_id, history) if CHAT_REUSE_CONTEXT else None
+    if state is not None:
+        seen = state["rows"]
+        context, rows = get_module_context(module_id, question, question_vector, skip_rows=seen)
+        if rows is None:
+            # Summary context was part of the first prompt already
+            context, rows = "", seen
+        else:
+            rows = rows | (seen or set())
+
+        prompt = f"Additional context:\n{context.strip()}\n\n" if context.strip() else ""
+        prompt += f"Question: {question.strip()}"
+        options["context"] = state["context"]
+        return prompt, options, rows
 
     system_prompt = (
         "You are an expert course assistant. Always answer based on the provided course content only."
     )
 
-    # Fetch context (module summary)
-    context = get_module_summary(module_id)
+    # Fetch context (relevant transcript chunks, or the module summary)
+    context, rows = get_module_context(module_id, question, question_vector)
 
-    # Build history string
-    history_str = ""
-    for q, a in history:
-        history_str += f"Q: {q}\nA: {a}\n"
+    # Build history string, newest turns first within the budget
+    history_str = budget_history(history)
 
     # Build final prompt
     prompt = (
@@ -36,18 +104,95 @@ def chat(question, module_id="", history=[]):
         f"Previous Q&A History:\n{history_str}\n\n"
         f"Question: {question.strip()}"
     )
+    return prompt, options, rows
+
 
+def remember_turn(module_id, history, question, answer, context, rows):
+    """Keep Ollama's context for this conversation so the next turn can continue it."""
+    if CHAT_REUSE_CONTEXT and context:
+        conversation_store.put(module_id, list(history or []) + [[question, answer]], context, rows)
+
+
+def embed_question(question):
+    """Question embedding shared by the response cache and transcript retrieval."""
     try:
-        response = requests.post(
-            "http://192.168.0.65:11434/api/generate",
-            json={
-                "model": "gemma3:27b",
-                "prompt": prompt,
-                "stream": False
-            }
-        )
-        result = response.json().get("response", "Sorry, no answer found.")
+        return chat_cache.embed(question)
+    except Exception as e:
+        print(f"⚠️ Could not embed chat question: {e}")
+        return None
+
+
+def chat(question, module_id="", history=[]):
+    """
+    Sends a chat request to the LLM server and returns the response.
+    """
+    question_vector = embed_question(question)
+    if question_vector is not None:
+        cached = chat_cache.lookup(module_id, question_vector, history)
+        if cached is not None:
+            print(f"🎯 Chat cache hit (module {module_id or '-'})")
+            return {"success": True, "response": cached, "cached": True}
+
+    prompt, options, rows = build_chat_prompt(question, module_id, history, question_vector)
+
+    try:
+        data = generate("chat", prompt, **options)
+        result = data.get("response")
+        if not result or not result.strip():
+            # Nothing to reuse: a fallback must not be cached or become part of the conversation
+            return {"success": True, "response": NO_ANSWER}
+
+        remember_turn(module_id, history, question, result, data.get("context"), rows)
+        if question_vector is not None:
+            chat_cache.store(module_id, question_vector, history, result)
         return {"success": True, "response": result}
 
     except Exception as e:
         return {"success": False, "response": f"Error: {str(e)}"}
+
+
+def chat_stream(question, module_id="", history=[]):
+    """
+    Streaming variant of chat(): yields answer tokens as the LLM produces them
+    and logs time-to-first-token. A cache hit is yielded as a single token.
+    Errors propagate to the caller.
+    """
+    question_vector = embed_question(question)
+    if question_vector is not None:
+        cached = chat_cache.lookup(module_id, question_vector, history)
+        if cached is not None:
+            print(f"🎯 Chat cache hit (module {module_id or '-'})")
+            yield cached
+            return
+
+    prompt, options, rows = build_chat_prompt(question, module_id, history, question_vector)
+
+    started = time.monotonic()
+    first_token_at = None
+    parts = []
+    completed = False
+    context = None
+    try:
+        for chunk in generate_stream("chat", prompt, **options):
+            if chunk.get("done"):
+                context = chunk.get("context")
+            token = chunk.get("response", "")
+            if not token:
+                continue
+            if first_token_at is None:
+                first_token_at = time.monotonic()
+                print(f"⚡ Chat first token after {first_token_at - started:.2f}s (module {module_id or '-'})")
+            parts.append(token)
+            yield token
+        completed = True
+    finally:
+        total = time.monotonic() - started
+        ttft = f"{first_token_at - started:.2f}s" if first_token_at is not None else "n/a"
+        print(f"💬 Chat stream finished: {len(parts)} chunks in {total:.2f}s (first token {ttft})")
+
+    # Only complete, non-empty answers are cached; an aborted stream may be cut short
+    answer = "".join(parts)
+    if completed and answer.strip():
+        remember_turn(module_id, history, question, answer, context, rows)
+        if question_vector is not None:
+            chat_cache.store(module_id, question_vector, history, answer)
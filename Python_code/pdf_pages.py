@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+import hashlib
+import subprocess
+import multiprocessing
+import PyPDF2
+
+# PDF text is cached per page (keyed by file hash); big PDFs are extracted in parallel page ranges
+PDF_PAGE_CACHE_DIR = os.getenv("PDF_PAGE_CACHE_DIR", "pdf_page_cache")
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(8, os.cpu_count() or 1))))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "100"))
+
+# This module only needs PyPDF2, so page-range workers run it directly as a script
+# instead of through a multiprocessing pool, which would unpickle tasks and
+# start a pool per document just to read a PDF.
+
+
+class PdfExtractionError(Exception):
+    """Raised when some pages of a PDF could not be extracted."""
+
+
+def file_sha256(file_path, digest=None):
+    """Stream a file through sha256 (or update the digest passed in)."""
+    digest = digest or hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest
+
+def pdf_page_cache_folder(pdf_path):
+    return os.path.join(PDF_PAGE_CACHE_DIR, file_sha256(pdf_path).hexdigest())
+
+def pdf_page_path(cache_folder, page_number):
+    return os.path.join(cache_folder, f"page_{page_number:05d}.txt")
+
+def extract_pdf_page_range(pdf_path, cache_folder, first_page, last_page):
+    """
+    Extract pages [first_page, last_page) into the page cache, skipping pages
+    already cached. A page that fails gets no cache file, so it is retried
+    next time; returns the failed page numbers.
+    """
+    failed = []
+    with open(pdf_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        for number in range(first_page, last_page):
+            page_path = pdf_page_path(cache_folder, number)
+            if os.path.exists(page_path):
+                continue
+            try:
+                page_text = reader.pages[number].extract_text() or ""
+            except Exception as e:
+                print(f"❌ Error extracting page {number + 1} of {pdf_path}: {e}", file=sys.stderr)
+                failed.append(number)
+                continue
+            tmp_path = f"{page_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(page_text)
+            os.replace(tmp_path, page_path)
+    return failed
+
+def extract_in_subprocesses(pdf_path, cache_folder, ranges):
+    """Run each page range in its own `python pdf_pages.py` process; returns the failed page numbers."""
+    processes = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), pdf_path, cache_folder, str(first), str(last)],
+                         stdout=subprocess.PIPE, text=True)
+        for first, last in ranges
+    ]
+
+    failed = []
+    for (first, last), process in zip(ranges, processes):
+        output, _ = process.communicate()
+        if process.returncode != 0:
+            print(f"❌ Page range {first + 1}-{last} of {pdf_path} failed (exit code {process.returncode})")
+            failed.extend(range(first, last))
+            continue
+        failed.extend(json.loads(output))
+    return failed
+
+def cache_pdf_pages(pdf_path, workers=PDF_WORKERS):
+    """
+    Make sure every page of the PDF is in the page cache (keyed by file hash)
+    and return (cache_folder, page_count, failed page numbers). Large
+    documents are split into page ranges across worker processes when called
+    from the main process. Failed pages are left out of the cache and the
+    cache is not marked complete, so the next call retries just those pages.
+    """
+    cache_folder = pdf_page_cache_folder(pdf_path)
+    meta_path = os.path.join(cache_folder, "meta.json")
+
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return cache_folder, json.load(f)["pages"], []
+
+    os.makedirs(cache_folder, exist_ok=True)
+    with open(pdf_path, 'rb') as file:
+        page_count = len(PyPDF2.PdfReader(file).pages)
+
+    in_main_process = multiprocessing.parent_process() is None
+    if workers > 1 and page_count >= PDF_PARALLEL_MIN_PAGES and in_main_process:
+        step = -(-page_count // workers)
+        ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+        print(f"⚙️ Extracting {page_count} PDF pages in {len(ranges)} parallel range(s)")
+        failed = extract_in_subprocesses(pdf_path, cache_folder, ranges)
+    else:
+        failed = extract_pdf_page_range(pdf_path, cache_folder, 0, page_count)
+
+    if failed:
+        print(f"⚠️ {len(failed)} page(s) of {pdf_path} could not be extracted; they will be retried next time")
+        return cache_folder, page_count, failed
+
+    # meta.json is written last and only when every page succeeded, so its presence means the cache is complete
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"pages": page_count}, f)
+    return cache_folder, page_count, []
+
+def iter_pdf_pages(pdf_path, workers=PDF_WORKERS):
+    """
+    Yield the text of each PDF page in order, reading lazily from the page
+    cache. Raises PdfExtractionError before yielding anything if some pages
+    could not be extracted, so a gap never passes for a blank page.
+    """
+    cache_folder, page_count, failed = cache_pdf_pages(pdf_path, workers)
+    if failed:
+        pages = ", ".join(str(number + 1) for number in sorted(failed)[:10])
+        raise PdfExtractionError(f"{len(failed)} of {page_count} page(s) could not be extracted (pages {pages}"
+                                 f"{', ...' if len(failed) > 10 else ''})")
+
+    for number in range(page_count):
+        with open(pdf_page_path(cache_folder, number), "r", encoding="utf-8") as f:
+            yield f.read()
+
+def extract_text_from_pdf(pdf_path):
+    """
+    The whole document's text, for the lesson transcript. Pages are read one
+    at a time from the cache, but the lesson and module transcripts are built
+    as strings, so the joined text is held in memory. Raises
+    PdfExtractionError when pages are missing.
+    """
+    print(f"📄 Extracting text from PDF: {pdf_path}")
+    pages = [page_text for page_text in iter_pdf_pages(pdf_path) if page_text]
+    print(f"   🔸 Extracted {len(pages)} page(s) with text")
+    return "\n".join(pages).strip()
+
+
+if __name__ == "__main__":
+    # Worker entry point: pdf_pages.py <pdf_path> <cache_folder> <first_page> <last_page>
+    pdf_path, cache_folder, first_page, last_page = sys.argv[1:5]
+    print(json.dumps(extract_pdf_page_range(pdf_path, cache_folder, int(first_page), int(last_page))))
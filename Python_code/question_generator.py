@@ -1,9 +1,50 @@
 import os
 import json
 import re
-import requests
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from llm_client import generate
+from source_hashes import source_hash, record_source
+
+# Upper bound on concurrent MCQ requests across all transcripts, and extra tries per chunk
+MCQ_MAX_IN_FLIGHT = int(os.getenv("MCQ_MAX_IN_FLIGHT", "4"))
+MCQ_RETRIES = int(os.getenv("MCQ_RETRIES", "2"))
+# "schema" constrains output to MCQ_SCHEMA (Ollama >= 0.5); "json" only forces valid JSON
+MCQ_FORMAT = os.getenv("MCQ_FORMAT", "schema")
+
+DIFFICULTIES = ["beginner", "intermediate", "advanced"]
+OPTION_KEYS = ["option1", "option2", "option3", "option4"]
+
+MCQ_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "questions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "difficulty": {"type": "string", "enum": DIFFICULTIES},
+                    "question_text": {"type": "string"},
+                    "options": {
+                        "type": "object",
+                        "properties": {key: {"type": "string"} for key in OPTION_KEYS},
+                        "required": OPTION_KEYS
+                    },
+                    "correct_answer": {"type": "string", "enum": OPTION_KEYS}
+                },
+                "required": ["difficulty", "question_text", "options", "correct_answer"]
+            }
+        }
+    },
+    "required": ["questions"]
+}
 
 def extract_json_from_text(text):
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    # Fallback for output with prose around the JSON
     try:
         match = re.search(r'\{[\s\S]*\}', text)
         if match:
@@ -30,17 +71,54 @@ def split_text(text, chunk_size=3000, delimiter="-------------------"):
 
     return final_chunks
 
-def generate_mcqs_from_chunk(text_chunk, model="gemma3:27b", chunk_index=1, debug=False, count=5):
+def validate_mcqs(data, count):
+    """
+    (valid questions, at most `count`; number of rejected questions) from a
+    parsed MCQ response. Accepts the {"questions": [...]} shape requested from
+    the model as well as the older {"1": {...}, "2": {...}} shape. Raises
+    ValueError if none are usable.
+    """
+    if isinstance(data, dict) and isinstance(data.get("questions"), list):
+        candidates = data["questions"]
+    elif isinstance(data, dict):
+        candidates = list(data.values())
+    else:
+        raise ValueError("response is not a JSON object")
+
+    valid, problems = [], []
+    for question in candidates:
+        if not isinstance(question, dict):
+            problems.append("question is not an object")
+            continue
+        options = question.get("options")
+        if not isinstance(options, dict) or any(not str(options.get(key, "")).strip() for key in OPTION_KEYS):
+            problems.append("missing options")
+            continue
+        if len({str(options[key]).strip().lower() for key in OPTION_KEYS}) < len(OPTION_KEYS):
+            problems.append("duplicate options")
+            continue
+        if not str(question.get("question_text", "")).strip():
+            problems.append("missing question_text")
+            continue
+        if question.get("correct_answer") not in OPTION_KEYS:
+            problems.append(f"bad correct_answer {question.get('correct_answer')!r}")
+            continue
+
+        valid.append({
+            "difficulty": question.get("difficulty") if question.get("difficulty") in DIFFICULTIES else "intermediate",
+            "question_text": str(question["question_text"]).strip(),
+            "options": {key: str(options[key]).strip() for key in OPTION_KEYS},
+            "correct_answer": question["correct_answer"],
+        })
+
+    if not valid:
+        raise ValueError(f"no valid questions ({'; '.join(problems) or 'empty list'})")
+    return valid[:count], len(problems)
+
+def build_mcq_prompt(text_chunk, count):
     system_prompt = f"""
 You are an expert educator and question paper designer.
 
-Important instructions:
-- Use only valid JSON.
-- All keys and string values must be enclosed in double quotes ("like this").
-- No trailing commas.
-- No comments or explanations.
-- Output ONLY JSON.
-
 Generate exactly **{count} MCQs** based on the text below. Each question must include:
 - "difficulty": "beginner", "intermediate", or "advanced"
 - A relevant and meaningful "question_text"
@@ -50,122 +128,218 @@ Generate exactly **{count} MCQs** based on the text below. Each question must in
 Use this JSON format exactly:
 
 {{
-    "1": {{
-        "difficulty": "beginner",
-        "question_text": "What does CPU stand for in computing?",
-        "options": {{
-            "option1": "Central Processing Unit",
-            "option2": "Computer Processing Utility",
-            "option3": "Control Program Unit",
-            "option4": "Central Programming Unit",
-        }},
+    "questions": [
+        {{
+            "difficulty": "beginner",
+            "question_text": "What does CPU stand for in computing?",
+            "options": {{
+                "option1": "Central Processing Unit",
+                "option2": "Computer Processing Utility",
+                "option3": "Control Program Unit",
+                "option4": "Central Programming Unit"
+            }},
             "correct_answer": "option1"
-    }},
-    "2": {{
-        "difficulty": "intermediate",
-        "question_text": "Which of the following is NOT a feature of object-oriented programming?",
-        "options": {{
-            "option1": "Encapsulation",
-            "option2": "Polymorphism",
-            "option3": "Inheritance",
-            "option4": "Compilation",
-        }},
-            "correct_answer": "option4"
-    }},
-    "3": {{
-        "difficulty": "advanced",
-        "question_text": "What is the time complexity of binary search on a sorted list of n elements?",
-        "options": {{
-            "option1": "O(n)",
-            "option2": "O(log n)",
-            "option3": "O(n log n)",
-            "option4": "O(1)",
         }},
+        {{
+            "difficulty": "advanced",
+            "question_text": "What is the time complexity of binary search on a sorted list of n elements?",
+            "options": {{
+                "option1": "O(n)",
+                "option2": "O(log n)",
+                "option3": "O(n log n)",
+                "option4": "O(1)"
+            }},
             "correct_answer": "option2"
-    }}
+        }}
+    ]
 }}
 
 🧠 Generate {count} unique and insightful MCQs based on the following text. The questions must reflect actual understanding of the content.
 Only return valid JSON. No extra explanation or comments.
 """
-    prompt = f"{system_prompt}\n{text_chunk}"
-
-    response = requests.post(
-        "http://192.168.13.28:11434/api/generate",
-        json={
-            "model": "llama3.3:latest",
-            "prompt": prompt,
-            "stream": False
-        }
-    )
+    return f"{system_prompt}\n{text_chunk}"
+
+def run_mcq_chunk(text_chunk, chunk_index=1, count=5, debug=False, retries=MCQ_RETRIES, model=None):
+    """
+    Generate MCQs for one chunk, retrying this chunk alone when the call fails
+    or its output doesn't validate. Returns a record with the questions (None
+    on failure) and per-chunk stats. model defaults to the "mcq" backend's.
+    """
+    prompt = build_mcq_prompt(text_chunk, count)
+    output_format = MCQ_SCHEMA if MCQ_FORMAT == "schema" else "json"
+    record = {"chunk": chunk_index, "questions": None, "attempts": 0, "latencies": [],
+              "parse_failures": 0, "api_failures": 0, "invalid_questions": 0, "error": None}
+
+    for attempt in range(retries + 1):
+        record["attempts"] += 1
+        started = time.monotonic()
+        try:
+            raw_output = generate("mcq", prompt, model=model, format=output_format).get("response", "")
+        except Exception as e:
+            record["latencies"].append(time.monotonic() - started)
+            record["api_failures"] += 1
+            record["error"] = f"API call failed: {e}"
+            print(f"❌ API call failed for chunk #{chunk_index} (attempt {attempt + 1}): {e}")
+            continue
+        record["latencies"].append(time.monotonic() - started)
 
-    if response.status_code == 200:
-        raw_output = response.json().get("response", "")
         if debug:
             print(f"\n🧩 Raw response for chunk #{chunk_index}:\n", raw_output)
-        return extract_json_from_text(raw_output)
-    else:
-        print(f"❌ API call failed for chunk #{chunk_index}: {response.status_code}")
+
+        try:
+            data = extract_json_from_text(raw_output)
+            if data is None:
+                raise ValueError("no JSON object in response")
+            questions, invalid = validate_mcqs(data, count)
+        except ValueError as e:
+            record["parse_failures"] += 1
+            record["error"] = f"invalid output: {e}"
+            print(f"⚠️ Chunk #{chunk_index} output rejected (attempt {attempt + 1}): {e}")
+            continue
+
+        record["questions"] = questions
+        record["invalid_questions"] += invalid
+        record["error"] = None
+        break
+
+    return record
+
+def generate_mcqs_from_chunk(text_chunk, model=None, chunk_index=1, debug=False, count=5):
+    """Numbered MCQs ({"1": {...}}) for a single chunk, or None if generation failed."""
+    questions = run_mcq_chunk(text_chunk, chunk_index=chunk_index, count=count, debug=debug, model=model)["questions"]
+    if not questions:
         return None
+    return {str(i): question for i, question in enumerate(questions, start=1)}
+
+def number_questions(records):
+    """Merge chunk records in chunk order into the {"1": {...}, ...} file format."""
+    final_mcqs = {}
+    for record in sorted(records, key=lambda r: r["chunk"]):
+        for question in record["questions"] or []:
+            final_mcqs[str(len(final_mcqs) + 1)] = question
+    return final_mcqs
+
+def summarize_mcq_stats(records):
+    latencies = sorted(latency for record in records for latency in record["latencies"])
+    percentile = lambda p: round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 2) if latencies else None
+    return {
+        "chunks": len(records),
+        "failed_chunks": sum(1 for record in records if not record["questions"]),
+        "questions": sum(len(record["questions"] or []) for record in records),
+        "attempts": sum(record["attempts"] for record in records),
+        "parse_failures": sum(record["parse_failures"] for record in records),
+        "api_failures": sum(record["api_failures"] for record in records),
+        "invalid_questions": sum(record["invalid_questions"] for record in records),
+        "latency_p50_s": percentile(0.5),
+        "latency_p95_s": percentile(0.95),
+        "latency_max_s": round(latencies[-1], 2) if latencies else None,
+    }
 
-def generate_mcqs_from_large_file(file_path, model="llama3:latest", debug=False, chunk_size=3000, count_per_chunk=4):
+def generate_mcqs_from_large_file(file_path, model=None, debug=False, chunk_size=3000, count_per_chunk=4,
+                                  max_in_flight=MCQ_MAX_IN_FLIGHT):
     try:
         with open(file_path, "r", encoding="utf-8") as f:
             full_text = f.read()
 
         chunks = split_text(full_text, chunk_size=chunk_size)
-        total_chunks = len(chunks)
-        print(f"📦 Splitting into {total_chunks} chunk(s) for {os.path.basename(file_path)}...")
+        print(f"📦 Splitting into {len(chunks)} chunk(s) for {os.path.basename(file_path)}...")
 
-        final_mcqs = {}
-        question_number = 1
+        with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+            records = list(pool.map(
+                lambda item: run_mcq_chunk(item[1], chunk_index=item[0] + 1, count=count_per_chunk, debug=debug, model=model),
+                enumerate(chunks)
+            ))
 
-        for idx, chunk in enumerate(chunks):
-            chunk_mcqs = generate_mcqs_from_chunk(
-                text_chunk=chunk,
-                model=model,
-                chunk_index=idx + 1,
-                debug=debug,
-                count=count_per_chunk
-            )
-
-            if chunk_mcqs:
-                for key in chunk_mcqs:
-                    final_mcqs[str(question_number)] = chunk_mcqs[key]
-                    question_number += 1
-
-        return final_mcqs
+        print(f"📊 MCQ stats for {os.path.basename(file_path)}: {summarize_mcq_stats(records)}")
+        return number_questions(records)
 
     except Exception as e:
         print(f"⚠️ Error in processing file {file_path}: {e}")
         return None
 
-def generate_all_questions_from_transcripts_folder(transcripts_folder, output_folder, model="llama3:latest", debug=False):
+def generate_all_questions_from_transcripts_folder(transcripts_folder, output_folder, model=None, debug=False,
+                                                   chunk_size=3000, count_per_chunk=4, max_in_flight=MCQ_MAX_IN_FLIGHT,
+                                                   progress=None, file_names=None):
+    """
+    Generate MCQs for every transcript in the folder, or only those listed in
+    `file_names` when given. Chunks from all files share one pool with at most
+    `max_in_flight` requests outstanding; each file is written as soon as its
+    last chunk is back, with a source sidecar holding the transcript hash so
+    course_ingest can tell when it is out of date. Returns overall and
+    per-file stats (latency, parse failures, retries). progress(done, total)
+    is called as chunks finish.
+    """
+    stats = {"files": {}}
     try:
         files = [f for f in os.listdir(transcripts_folder) if f.endswith(".txt")]
+        if file_names is not None:
+            files = [f for f in files if f in file_names]
         print(f"📚 Found {len(files)} transcript file(s) to process.")
 
         os.makedirs(output_folder, exist_ok=True)
 
+        # module_name -> {"chunks", "records", "source_hash"}
+        jobs = {}
         for file_name in files:
             module_name = os.path.splitext(file_name)[0]
-            print(f"🛠️ Generating questions for {module_name}...")
+            with open(os.path.join(transcripts_folder, file_name), "r", encoding="utf-8") as f:
+                text = f.read()
+            chunks = split_text(text, chunk_size=chunk_size)
+
+            # A job with no chunks would never be finalized
+            if not chunks:
+                print(f"⚠️ Empty transcript: {file_name}. Skipping.")
+                continue
+
+            print(f"🛠️ Generating questions for {module_name} ({len(chunks)} chunk(s))...")
+            jobs[module_name] = {"chunks": chunks, "records": [], "source_hash": source_hash(text)}
+
+        all_records = []
+        with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+            futures = {
+                pool.submit(run_mcq_chunk, chunk, i + 1, count_per_chunk, debug, model=model): module_name
+                for module_name, job in jobs.items()
+                for i, chunk in enumerate(job["chunks"])
+            }
 
-            file_path = os.path.join(transcripts_folder, file_name)
-            result = generate_mcqs_from_large_file(file_path, model=model, debug=debug)
+            for future in as_completed(futures):
+                module_name = futures[future]
+                job = jobs[module_name]
+                record = future.result()
+                job["records"].append(record)
+                all_records.append(record)
+                if progress:
+                    progress(len(all_records), len(futures))
 
-            if result:
-                output_file = os.path.join(output_folder, f"{module_name}_questions.json")
-                with open(output_file, "w", encoding="utf-8") as f:
-                    json.dump(result, f, indent=4, ensure_ascii=False)
+                latency = sum(record["latencies"])
+                status = f"{len(record['questions'])} question(s)" if record["questions"] else f"failed: {record['error']}"
+                print(f"  🧩 {module_name}: chunk {record['chunk']} in {latency:.1f}s over {record['attempts']} attempt(s), {status}")
 
-                print(f"✅ Saved questions for {module_name} to {output_file}")
-            else:
-                print(f"⚠️ No questions generated for {module_name}.")
+                if len(job["records"]) < len(job["chunks"]):
+                    continue
+
+                file_stats = summarize_mcq_stats(job["records"])
+                stats["files"][module_name] = file_stats
+                result = number_questions(job["records"])
+
+                if result:
+                    output_file = os.path.join(output_folder, f"{module_name}_questions.json")
+                    with open(output_file, "w", encoding="utf-8") as f:
+                        json.dump(result, f, indent=4, ensure_ascii=False)
+                    record_source(output_file, job["source_hash"])
+
+                    print(f"✅ Saved {len(result)} questions for {module_name} to {output_file} {file_stats}")
+                else:
+                    print(f"⚠️ No questions generated for {module_name}.")
+
+        stats.update(summarize_mcq_stats(all_records))
+        print(f"📊 MCQ generation stats: { {k: v for k, v in stats.items() if k != 'files'} }")
 
     except Exception as e:
         print(f"🔥 Error during question generation: {e}")
 
+    return stats
+
 # ✅ Hardcoding the folder paths
 transcripts_folder = "module_transcripts"  # or "video_transcripts", whichever one you are using
 output_folder = "generated_questions"
@@ -1,73 +1,194 @@
-import psycopg2
 import json
+from collections import Counter
 from dotenv import load_dotenv
 import os
+from psycopg2.extras import execute_values, Json
+from db import connection
 
 load_dotenv()
 
-def insert_questions(json_file_path, course_id, module_ids, db_url=os.getenv("DATABASE_URL")):
-    result = {
-        "questions_inserted": 0,
-        "messages": []
+# Values of the "QuestionDifficulty" enum; anything else would abort the whole transaction
+DIFFICULTIES = ("beginner", "intermediate", "advanced")
+# Rows per INSERT statement when staging questions
+QUESTION_INSERT_PAGE_SIZE = int(os.getenv("QUESTION_INSERT_PAGE_SIZE", "1000"))
+
+
+def validate_question(q_data):
+    """Normalised question row fields, or raises ValueError with the reason."""
+    if not isinstance(q_data, dict):
+        raise ValueError("not an object")
+
+    question_text = str(q_data.get("question_text") or "").strip()
+    options = q_data.get("options", {})
+    correct_answer = q_data.get("correct_answer")
+    difficulty = q_data.get("difficulty")
+
+    if not question_text or not correct_answer:
+        raise ValueError("missing text or correct answer")
+    if not isinstance(options, dict) or not options:
+        raise ValueError("missing options")
+    if correct_answer not in options:
+        raise ValueError(f"correct answer {correct_answer!r} is not one of the options")
+    if difficulty not in DIFFICULTIES:
+        raise ValueError(f"unknown difficulty {difficulty!r}")
+
+    return {
+        "question_text": question_text,
+        "difficulty": difficulty,
+        "options": options,
+        "correct_answer": correct_answer,
+        "explanation": q_data.get("explanation", None),
     }
-# cur.execute("DELETE FROM questions")
-    try:
-        print(f"🔌 Connecting to DB for insertion...")
-        conn = psycopg2.connect(db_url)
-        cur = conn.cursor()
 
-        # Load JSON data
-        with open(json_file_path, "r") as file:
-            json_data = json.load(file)
-        print(f"📂 Loaded {len(json_data)} questions from {json_file_path}")
 
+def collect_questions(assignments):
+    """
+    Load and validate every question before touching the database.
+    `assignments` is [(json_file_path, [module_id, ...])]; questions in a file
+    are spread round-robin over its module ids. Returns (rows, rejected,
+    messages) where rejected lists {"file", "question", "reason"}.
+    """
+    rows, rejected, messages = [], [], []
+    for json_file_path, module_ids in assignments:
+        try:
+            with open(json_file_path, "r", encoding="utf-8") as file:
+                json_data = json.load(file)
+        except Exception as e:
+            messages.append(f"❌ Could not read {json_file_path}: {e}")
+            continue
+
+        print(f"📂 Loaded {len(json_data)} questions from {json_file_path}")
         if not json_data:
-            result["messages"].append("⚠️ No data found in the JSON file.")
-            return result
+            messages.append(f"⚠️ No data found in {json_file_path}.")
+            continue
 
-        # Clear old data
-        # cur.execute("DELETE FROM questions")
-        result["messages"].append("🧹 Cleared existing data from 'questions'.")
+        for idx, (q_id, q_data) in enumerate(json_data.items()):
+            try:
+                row = validate_question(q_data)
+            except ValueError as e:
+                print(f"⚠️ Skipping question {q_id} in {os.path.basename(json_file_path)}: {e}")
+                rejected.append({"file": json_file_path, "question": q_id, "reason": str(e)})
+                continue
+            row["module_id"] = module_ids[idx % len(module_ids)]
+            rows.append(row)
 
-        module_count = len(module_ids)
+    return rows, rejected, messages
 
-        for idx, (q_id, q_data) in enumerate(json_data.items()):
-            module_id = module_ids[idx % module_count]
 
-            question_text = q_data.get("question_text")
-            difficulty = q_data.get("difficulty")
-            options = q_data.get("options", {})
-            correct_answer = q_data.get("correct_answer")
-            explanation = q_data.get("explanation", None)
+def bulk_insert_questions(rows, upsert=False, lock_key=None):
+    """
+    Write validated question rows in one transaction. Rows are staged in a
+    temporary table with execute_values, then copied into questions with a
+    single INSERT ... SELECT.
 
-            if not question_text or not correct_answer:
-                print(f"⚠️ Skipping question {q_id} due to missing text or correct answer.")
-                continue
+    With upsert=True, a question whose (module_id, question_text) already
+    exists is updated in place instead of inserted again, so re-running the
+    pipeline does not duplicate rows. lock_key (e.g. the course id) serialises
+    concurrent upserts for the same course. Returns per-module
+    {"inserted", "updated"} counts.
+    """
+    if upsert:
+        # The last copy of a question within the batch wins
+        rows = list({(row["module_id"], row["question_text"]): row for row in rows}.values())
+
+    inserted, updated = Counter(), Counter()
+    with connection() as conn, conn.cursor() as cur:
+        if upsert and lock_key is not None:
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('questions'), %s)", (int(lock_key),))
 
-            # Insert into questions table
+        cur.execute("""
+            CREATE TEMP TABLE incoming_questions (
+                module_id INTEGER,
+                question_text TEXT,
+                difficulty TEXT,
+                options JSONB,
+                correct_answer TEXT,
+                explanation TEXT
+            ) ON COMMIT DROP
+        """)
+        execute_values(cur, """
+            INSERT INTO incoming_questions (module_id, question_text, difficulty, options, correct_answer, explanation)
+            VALUES %s
+        """, [
+            (row["module_id"], row["question_text"], row["difficulty"],
+             Json(row["options"], dumps=lambda value: json.dumps(value, ensure_ascii=False)),
+             row["correct_answer"], row["explanation"])
+            for row in rows
+        ], page_size=QUESTION_INSERT_PAGE_SIZE)
+
+        if upsert:
             cur.execute("""
-                INSERT INTO questions (module_id, question_text, difficulty, options, correct_answer, explanation, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s, NOW())
-            """, (
-                module_id,
-                question_text,
-                difficulty,
-                json.dumps(options, ensure_ascii=False),  
-                correct_answer,
-                explanation
-            ))
-
-            result["questions_inserted"] += 1
+                UPDATE questions q
+                SET difficulty = i.difficulty::"QuestionDifficulty",
+                    options = i.options,
+                    correct_answer = i.correct_answer,
+                    explanation = i.explanation
+                FROM incoming_questions i
+                WHERE q.module_id = i.module_id AND q.question_text = i.question_text
+                RETURNING q.module_id
+            """)
+            updated.update(module_id for (module_id,) in cur.fetchall())
+
+        cur.execute("""
+            INSERT INTO questions (module_id, question_text, difficulty, options, correct_answer, explanation, created_at)
+            SELECT i.module_id, i.question_text, i.difficulty::"QuestionDifficulty", i.options,
+                   i.correct_answer, i.explanation, NOW()
+            FROM incoming_questions i
+        """ + ("""
+            WHERE NOT EXISTS (
+                SELECT 1 FROM questions q
+                WHERE q.module_id = i.module_id AND q.question_text = i.question_text
+            )
+        """ if upsert else "") + """
+            RETURNING module_id
+        """)
+        inserted.update(module_id for (module_id,) in cur.fetchall())
 
         conn.commit()
-        result["messages"].append(f"✅ Inserted {result['questions_inserted']} questions.")
+
+    module_ids = sorted(set(row["module_id"] for row in rows))
+    return {module_id: {"inserted": inserted[module_id], "updated": updated[module_id]} for module_id in module_ids}
+
+
+def insert_course_questions(assignments, course_id=None, upsert=False):
+    """
+    Validate and insert all generated questions for a course at once.
+    `assignments` is [(json_file_path, [module_id, ...])].
+    """
+    result = {
+        "success": False,
+        "questions_inserted": 0,
+        "questions_updated": 0,
+        "per_module": {},
+        "rejected": [],
+        "messages": []
+    }
+
+    try:
+        rows, result["rejected"], result["messages"] = collect_questions(assignments)
+        if result["rejected"]:
+            result["messages"].append(f"⚠️ Skipped {len(result['rejected'])} invalid question(s).")
+
+        if not rows:
+            result["messages"].append("⚠️ No valid questions to insert.")
+            return result
+
+        print(f"🔌 Inserting {len(rows)} questions in one transaction{' (upsert)' if upsert else ''}...")
+        result["per_module"] = bulk_insert_questions(rows, upsert=upsert, lock_key=course_id)
+        result["questions_inserted"] = sum(counts["inserted"] for counts in result["per_module"].values())
+        result["questions_updated"] = sum(counts["updated"] for counts in result["per_module"].values())
+        result["success"] = True
+        result["messages"].append(
+            f"✅ Inserted {result['questions_inserted']} and updated {result['questions_updated']} questions."
+        )
 
     except Exception as e:
         result["messages"].append(f"❌ Error: {str(e)}")
         print(f"🔥 Exception during insertion: {e}")
 
-    finally:
-        if 'cur' in locals(): cur.close()
-        if 'conn' in locals(): conn.close()
-
     return result
+
+
+def insert_questions(json_file_path, course_id, module_ids, upsert=False):
+    """Insert one generated-questions file, spreading its questions over module_ids."""
+    return insert_course_questions([(json_file_path, list(module_ids))], course_id=course_id, upsert=upsert)
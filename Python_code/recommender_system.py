@@ -1,48 +1,144 @@
 # from flask import Flask, request, jsonify
-from sentence_transformers import SentenceTransformer, util
-import pandas as pd
-import torch
+import numpy as np
 # import psycopg2
 import os
+from course_embeddings import CourseEmbeddingStore, top_k_indices
+from ann_index import IVFIndex, ANN_MIN_COURSES
+from user_profiles import UserProfileStore
+from embeddings import model, EMBEDDING_MODEL_PATH
 
 # app = Flask(__name__)
-model = SentenceTransformer('./all-MiniLM-L6-v2')  # efficient model
-
-def get_recommendations(courses, current_titles, top_n=4):
-    df = pd.DataFrame(courses)
 
-    # Filter only valid titles
-    current_titles = [title for title in current_titles if title in df['title'].values]
-    if not current_titles:
+# Course embeddings are cached on disk and only re-encoded when a description changes
+embedding_store = CourseEmbeddingStore(model, model_name=EMBEDDING_MODEL_PATH)
+
+# Per-user profile vectors, updated incrementally as enrollments change
+user_profiles = UserProfileStore(embedding_store)
+
+# "exact" scores every accessible course; "ivf" uses the approximate index for large catalogs
+RECOMMENDER_ENGINE = os.getenv("RECOMMENDER_ENGINE", "exact")
+ANN_OVERSAMPLE = int(os.getenv("RECOMMENDER_ANN_OVERSAMPLE", "10"))
+ann_index = IVFIndex()
+
+def ann_top_k(courses, profile, enrolled, top_n):
+    """
+    Approximate top-k positions in `courses` via the IVF index over the whole
+    store. Access rights are applied after retrieval; returns None when too few
+    accessible candidates survive, so the caller can fall back to exact search.
+    """
+    with embedding_store.lock:
+        rows = embedding_store.sync(courses)
+        ann_index.sync(embedding_store)
+        vectors = embedding_store.vectors
+
+    # Store row -> position in `courses` (-1 for courses this user cannot access)
+    position = np.full(len(vectors), -1, dtype=np.int64)
+    position[rows] = np.arange(len(rows))
+
+    wanted = (top_n + int(enrolled.sum())) * ANN_OVERSAMPLE
+    positions = position[ann_index.search(profile, wanted, vectors)]
+    positions = positions[positions >= 0]
+    positions = positions[~enrolled[positions]][:top_n]
+
+    if len(positions) < min(top_n, int((~enrolled).sum())):
+        return None
+    return positions
+
+def get_profile_recommendations(courses, profile, enrolled_ids, top_n=4, engine=None):
+    """
+    Rank `courses` against a unit-length user profile vector, skipping the
+    course ids in `enrolled_ids`.
+    """
+    ids = np.array([course['id'] for course in courses], dtype=np.int64)
+    titles = np.array([course['title'] for course in courses], dtype=object)
+    enrolled = np.isin(ids, np.fromiter(enrolled_ids, dtype=np.int64))
+
+    if (engine or RECOMMENDER_ENGINE) == "ivf" and len(courses) >= ANN_MIN_COURSES:
+        positions = ann_top_k(courses, profile, enrolled, top_n)
+        if positions is not None:
+            return [{'id': int(ids[i]), 'title': titles[i]} for i in positions]
+        print("⚠️ ANN search returned too few accessible courses. Falling back to exact search.")
+
+    # Cosine similarity against the cached (unit length) course embeddings
+    similarity_scores = embedding_store.get_matrix(courses) @ profile
+
+    return [
+        {'id': int(ids[i]), 'title': titles[i]}
+        for i in top_k_indices(similarity_scores, enrolled, top_n)
+    ]
+
+def get_recommendations(courses, current_titles, top_n=4, engine=None):
+    current_titles = set(current_titles)
+    enrolled_courses = [course for course in courses if course['title'] in current_titles]
+    if not enrolled_courses:
         return []
 
-    # Encode course descriptions
-    embeddings = model.encode(df['description'].tolist(), convert_to_tensor=True)
-
-    current_indices = df[df['title'].isin(current_titles)].index.tolist()
-    current_embeddings = embeddings[current_indices]
-    average_embedding = torch.mean(current_embeddings, dim=0)
-
-    # Cosine similarity
-    similarity_scores = util.pytorch_cos_sim(average_embedding, embeddings)[0]
-
-    top_results = sorted(
-        list(enumerate(similarity_scores)),
-        key=lambda x: x[1],
-        reverse=True
-    )
-
-    recommended = []
-    for i, score in top_results:
-        if df.iloc[i]['title'] not in current_titles:
-            recommended.append({
-                'id': int(df.iloc[i]['id']),
-                'title': df.iloc[i]['title']
-            })
-        if len(recommended) == top_n:
-            break
-
-    return recommended
+    profile = embedding_store.get_matrix(enrolled_courses).mean(axis=0)
+    profile /= max(np.linalg.norm(profile), 1e-12)
+
+    enrolled_ids = {course['id'] for course in enrolled_courses}
+    return get_profile_recommendations(courses, profile, enrolled_ids, top_n=top_n, engine=engine)
+
+def get_batch_recommendations(courses, access, enrollments, top_n=4, block_size=256):
+    """
+    Score many users against the catalog in one (users x courses) product.
+
+    `access` maps user_id -> set of accessible course ids (None means the whole
+    catalog, as for admins); `enrollments` maps user_id -> set of enrolled
+    course ids. Returns {user_id: [{'id', 'title'}, ...]}.
+    """
+    user_ids = list(access.keys())
+    results = {user_id: [] for user_id in user_ids}
+    if not courses or not user_ids:
+        return results
+
+    ids = np.array([course['id'] for course in courses], dtype=np.int64)
+    titles = np.array([course['title'] for course in courses], dtype=object)
+    embeddings = embedding_store.get_matrix(courses)
+    column_of = {int(cid): col for col, cid in enumerate(ids)}
+    top_n = min(top_n, len(ids))
+
+    # Work through users in blocks so the score matrix stays bounded
+    for start in range(0, len(user_ids), block_size):
+        block = user_ids[start:start + block_size]
+        accessible = np.zeros((len(block), len(ids)), dtype=bool)
+        enrolled = np.zeros((len(block), len(ids)), dtype=bool)
+
+        for row, user_id in enumerate(block):
+            allowed = access[user_id]
+            if allowed is None:
+                accessible[row] = True
+            else:
+                accessible[row, [column_of[cid] for cid in allowed if cid in column_of]] = True
+            enrolled[row, [column_of[cid] for cid in enrollments.get(user_id, ()) if cid in column_of]] = True
+
+        # Only enrollments inside the accessible catalog count towards the profile
+        enrolled &= accessible
+        counts = enrolled.sum(axis=1)
+
+        profiles = enrolled.astype(np.float32) @ embeddings
+        profiles /= np.maximum(np.linalg.norm(profiles, axis=1, keepdims=True), 1e-12)
+
+        scores = profiles @ embeddings.T
+        scores[~accessible | enrolled] = -np.inf
+
+        if top_n < len(ids):
+            winners = np.argpartition(-scores, top_n - 1, axis=1)[:, :top_n]
+        else:
+            winners = np.tile(np.arange(len(ids)), (len(block), 1))
+        winner_scores = np.take_along_axis(scores, winners, axis=1)
+        order = np.argsort(-winner_scores, axis=1, kind="stable")
+        winners = np.take_along_axis(winners, order, axis=1)
+
+        for row, user_id in enumerate(block):
+            if counts[row] == 0:
+                continue
+            results[user_id] = [
+                {'id': int(ids[i]), 'title': titles[i]}
+                for i in winners[row] if np.isfinite(scores[row, i])
+            ]
+
+    return results
 
 # @app.route('/recommend', methods=['POST'])
 # def recommend():
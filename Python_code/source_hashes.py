@@ -0,0 +1,36 @@
+import os
+import hashlib
+
+# Each generated file (summary, MCQs) gets a <file>.source sidecar holding the hash
+# of the transcript it was made from, so an edited lesson regenerates it.
+SOURCE_SUFFIX = ".source"
+
+
+def source_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def file_source_hash(path):
+    """Hash of a transcript file's text, or None if it doesn't exist."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return source_hash(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def is_current(output_path, expected_hash):
+    """True when output_path exists and was generated from text with expected_hash."""
+    if not os.path.exists(output_path):
+        return False
+    try:
+        with open(output_path + SOURCE_SUFFIX, "r", encoding="utf-8") as f:
+            return f.read().strip() == expected_hash
+    except FileNotFoundError:
+        return False
+
+
+def record_source(output_path, digest):
+    """Write the sidecar after output_path itself, so a crash in between only costs a regeneration."""
+    with open(output_path + SOURCE_SUFFIX, "w", encoding="utf-8") as f:
+        f.write(digest)
@@ -1,12 +1,17 @@
 import os
-import requests
-import json
 import re
-import psycopg2
+import shutil
+import threading
 from dotenv import load_dotenv
+from llm_client import generate
+from pathlib import Path
+from psycopg2.extras import execute_values
+from db import connection
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from token_budget import estimate_tokens, split_sentences, pack_by_tokens, truncate_to_tokens
+from source_hashes import source_hash, is_current, record_source
 
 load_dotenv()
-db_url = os.getenv("DATABASE_URL")
 
 # Step 1: Define folders
 video_transcripts_folder = "video_transcripts"
@@ -14,129 +19,320 @@ module_transcripts_folder = "module_transcripts"
 video_summaries_folder = "video_summaries"
 module_summaries_folder = "module_summaries"
 
+# Upper bound on concurrent summary requests across all files of a folder
+SUMMARY_MAX_IN_FLIGHT = int(os.getenv("SUMMARY_MAX_IN_FLIGHT", "8"))
+# Token budget per chunk sent to the LLM, and the size every final summary is reduced to
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "1000"))
+SUMMARY_TARGET_TOKENS = int(os.getenv("SUMMARY_TARGET_TOKENS", "800"))
+# Returned by the LLM helpers when a call fails; never written into a summary
+SUMMARY_FAILED = "[Summary failed]"
+# Successful map/reduce answers, kept by prompt hash so a retried file only re-runs the calls that failed
+SUMMARY_CALL_CACHE_DIR = os.getenv("SUMMARY_CALL_CACHE_DIR", "summary_call_cache")
+
 #Ensure output folders exist
 os.makedirs(video_summaries_folder, exist_ok=True)
 os.makedirs(module_summaries_folder, exist_ok=True)
 
-def update_lesson_summary_by_video_file(filepath, summary):
-    try:
-        # Extract filename from full path
-        filename = os.path.basename(filepath)
-
-        # Extract unique video ID from filename
-        match = re.search(r"(video-\d+-\d+)", filename)
-        if not match:
-            print(f"⚠️ Could not extract video ID from filename: {filename}")
-            return
-
-        video_id = match.group(1)
-        print(f"🔍 Extracted video ID: {video_id}")
-
-        # Connect to DB
-        conn = psycopg2.connect(db_url)
-        cursor = conn.cursor()
-
-        query = """
-            UPDATE lessons
-            SET summary = %s
-            WHERE video_url LIKE %s
-        """
-        like_pattern = f"%{video_id}%"  # Matches partial video URL
-        cursor.execute(query, (summary, like_pattern))
-
-        if cursor.rowcount > 0:
-            print(f"✅ Updated summary for {cursor.rowcount} lesson(s) with video_id: {video_id}")
+def video_key(path):
+    """Video transcripts are named <video file stem>_transcript.txt; the stem links a summary to its lesson."""
+    stem = Path(path).stem
+    for suffix in ("_transcript", "_summary"):
+        if stem.endswith(suffix):
+            stem = stem[:-len(suffix)]
+    return stem
+
+def resolve_lesson_ids(keys, cursor):
+    """
+    Lesson ids for video keys with no known id, found in one query. Only used
+    when the caller didn't pass lesson ids; still matches on the video id in
+    the URL, but scans lessons once per run instead of once per video.
+    """
+    video_ids = {}
+    for key in keys:
+        match = re.search(r"(video-\d+-\d+)", key)
+        if match:
+            video_ids[key] = match.group(1)
         else:
-            print(f"⚠️ No lessons found with video_id: {video_id}")
+            print(f"⚠️ Could not extract video ID from filename: {key}")
+
+    if not video_ids:
+        return {}
+
+    cursor.execute(
+        "SELECT id, video_url FROM lessons WHERE video_url LIKE ANY(%s)",
+        ([f"%{video_id}%" for video_id in set(video_ids.values())],)
+    )
+    resolved = {}
+    for lesson_id, video_url in cursor.fetchall():
+        for key, video_id in video_ids.items():
+            if video_id in (video_url or ""):
+                resolved.setdefault(key, []).append(lesson_id)
+    return resolved
+
+def update_lesson_summaries(summaries, lesson_ids=None):
+    """
+    Store video summaries on their lessons with one batched
+    UPDATE lessons ... FROM (VALUES ...) keyed by lesson id.
+
+    `summaries` maps video key -> summary and `lesson_ids` maps video key ->
+    lesson id (see video_key). Returns matched/unmatched counts; unmatched
+    covers videos with no lesson id and ids no longer in the table.
+    """
+    stats = {"matched": 0, "unmatched": 0, "unmatched_videos": []}
+    if not summaries:
+        return stats
+
+    lesson_ids = lesson_ids or {}
+    try:
+        with connection() as conn, conn.cursor() as cursor:
+            targets = {key: [lesson_ids[key]] for key in summaries if key in lesson_ids}
+            missing = [key for key in summaries if key not in lesson_ids]
+            if missing:
+                targets.update(resolve_lesson_ids(missing, cursor))
 
-        conn.commit()
-        cursor.close()
-        conn.close()
+            pairs = [(lesson_id, summaries[key]) for key, ids in targets.items() for lesson_id in ids]
+            updated = set()
+            if pairs:
+                rows = execute_values(cursor, """
+                    UPDATE lessons AS l
+                    SET summary = v.summary
+                    FROM (VALUES %s) AS v(id, summary)
+                    WHERE l.id = v.id
+                    RETURNING l.id
+                """, pairs, template="(%s::integer, %s::text)", page_size=500, fetch=True)
+                updated = {lesson_id for (lesson_id,) in rows}
+            conn.commit()
+
+        for key in summaries:
+            if any(lesson_id in updated for lesson_id in targets.get(key, [])):
+                stats["matched"] += 1
+            else:
+                stats["unmatched"] += 1
+                stats["unmatched_videos"].append(key)
+
+        print(f"✅ Updated lesson summaries: {stats['matched']} matched, {stats['unmatched']} unmatched")
+        if stats["unmatched"]:
+            print(f"⚠️ No lesson found for: {', '.join(stats['unmatched_videos'])}")
 
     except Exception as e:
         print(f"❌ Failed to update DB: {e}")
+        stats["error"] = str(e)
 
+    return stats
 
-# Step 2: Function to split text into manageable chunks
-def chunk_text(text, max_words=800):
-    sentences = text.split('. ')
-    chunks, chunk = [], ""
-    for sentence in sentences:
-        if len(chunk.split()) + len(sentence.split()) < max_words:
-            chunk += sentence + '. '
-        else:
-            chunks.append(chunk.strip())
-            chunk = sentence + '. '
-    if chunk:
-        chunks.append(chunk.strip())
-    return chunks
+
+# Step 2: Function to split text into token-budgeted chunks (linear in text length)
+def chunk_text(text, max_tokens=SUMMARY_CHUNK_TOKENS):
+    return pack_by_tokens(split_sentences(text), max_tokens)
 
 # Step 3: Function to summarize using Ollama LLaMA 3
-def summarize_with_ollama(chunk):
+def summarize_prompt(prompt, cache_folder=None):
+    """
+    Summary LLM answer for a prompt, or SUMMARY_FAILED. With cache_folder,
+    answers are looked up and saved there by prompt hash; failures never are.
+    """
+    cache_path = os.path.join(cache_folder, f"{source_hash(prompt)}.txt") if cache_folder else None
+    if cache_path:
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+
+    try:
+        response = generate("summary", prompt)['response'].strip()
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return SUMMARY_FAILED
+
+    if cache_path:
+        os.makedirs(cache_folder, exist_ok=True)
+        tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(response)
+        os.replace(tmp_path, cache_path)
+    return response
+
+def summarize_with_ollama(chunk, cache_folder=None):
     prompt = f"Summarize the following text:\n\n{chunk.strip()}\n\nSummary:"
-    response = requests.post(
-        "http://192.168.13.28:11434/api/generate",
-        headers={"Content-Type": "application/json"},
-        data=json.dumps({
-            "model": "llama3.3:latest",
-            "prompt": prompt,
-            "stream": False
-        })
+    return summarize_prompt(prompt, cache_folder)
+
+def combine_summaries_with_ollama(summaries, cache_folder=None):
+    prompt = (
+        "The following are partial summaries of consecutive parts of the same course material. "
+        "Combine them into one concise, well-organised summary without losing key concepts:\n\n"
+        + "\n\n".join(summary.strip() for summary in summaries)
+        + "\n\nSummary:"
     )
-    if response.status_code == 200:
-        return response.json()['response'].strip()
-    else:
-        print(f"❌ Error: {response.status_code}, {response.text}")
-        return "[Summary failed]"
+    return summarize_prompt(prompt, cache_folder)
+
+def reduce_groups(summaries, target_tokens, max_tokens):
+    """Groups to combine for the next reduce level, or None once the summaries fit target_tokens."""
+    if len(summaries) <= 1 or estimate_tokens("\n\n".join(summaries)) <= target_tokens:
+        return None
+
+    groups = pack_by_tokens(summaries, max_tokens, separator="\n\n")
+    if len(groups) >= len(summaries):
+        # Every summary is already near the chunk budget; pair them up to guarantee progress
+        groups = ["\n\n".join(summaries[i:i + 2]) for i in range(0, len(summaries), 2)]
+    return groups
+
+def reduce_summaries(summaries_by_file, pool, target_tokens=SUMMARY_TARGET_TOKENS, max_tokens=SUMMARY_CHUNK_TOKENS,
+                     cache_folder=None):
+    """
+    Reduce step of the map-reduce summary, run for all files together once the
+    map phase is done. Each level combines the groups of every file still over
+    target_tokens side by side on the pool, so summary length is bounded
+    regardless of input size and files are not reduced one after another. A
+    file whose combine call fails is dropped rather than saved from an earlier,
+    longer level. Returns (file -> summary text, failed files).
+    """
+    current = dict(summaries_by_file)
+    active = list(current)
+    failed = []
+    level = 0
+    while True:
+        work = {}
+        for file_name in active:
+            groups = reduce_groups(current[file_name], target_tokens, max_tokens)
+            if groups:
+                work[file_name] = groups
+        if not work:
+            break
+
+        level += 1
+        print(f"  🔁 Reduce level {level}: {sum(len(current[f]) for f in work)} summaries "
+              f"from {len(work)} file(s) -> {sum(len(groups) for groups in work.values())}")
+        futures = {
+            file_name: [pool.submit(combine_summaries_with_ollama, [group], cache_folder) for group in groups]
+            for file_name, groups in work.items()
+        }
+
+        active = []
+        for file_name, file_futures in futures.items():
+            combined = [future.result() for future in file_futures]
+            if SUMMARY_FAILED in combined:
+                print(f"❌ Combining summaries failed for {file_name} at reduce level {level}. Skipping.")
+                del current[file_name]
+                failed.append(file_name)
+                continue
+            current[file_name] = combined
+            active.append(file_name)
+
+    reduced = {file_name: truncate_to_tokens("\n\n".join(summaries), target_tokens)
+               for file_name, summaries in current.items()}
+    return reduced, failed
 
 # Step 4: Summarize transcripts from a folder if not already summarized
-def summarize_folder(input_folder, output_folder, isVideo):
+def summarize_folder(input_folder, output_folder, isVideo, max_in_flight=SUMMARY_MAX_IN_FLIGHT, lesson_ids=None,
+                     progress=None):
+    """
+    Summarize every transcript in input_folder whose summary is missing or was
+    made from a different version of the transcript (see source_hashes). Chunks
+    from all files are dispatched together with at most `max_in_flight` LLM
+    calls outstanding. A file with any failed chunk or combine call is reported
+    in "failed" and left unwritten; the calls that did succeed are kept in
+    SUMMARY_CALL_CACHE_DIR, so the next run only repeats the failed ones. After
+    the map phase every other file is reduced to SUMMARY_TARGET_TOKENS on the
+    same pool and written. The call cache is cleared once a run has no failures.
+
+    For video transcripts the new summaries are then saved to their lessons in
+    one batch, using `lesson_ids` (video key -> lesson id) where given.
+    Returns {"summarized", "failed", "lessons"} with the lesson update counts.
+    progress(done, total) is called as chunks come back.
+    """
+    result = {"summarized": 0, "failed": [], "lessons": None}
     if not os.path.exists(input_folder):
         print(f"⚠️ Folder not found: {input_folder}. Skipping summarization.")
-        return
+        return result
 
     files = [f for f in os.listdir(input_folder) if f.endswith(".txt")]
     if not files:
         print(f"⚠️ No transcripts found in {input_folder}. Skipping summarization.")
-        return
+        return result
 
     print(f"📄 Found {len(files)} transcript(s) in {input_folder} to process...")
 
+    # file_name -> {"output_path", "summaries": [None] * chunks, "done": count}
+    jobs = {}
     for file_name in files:
         input_path = os.path.join(input_folder, file_name)
         output_file_name = file_name.replace("_transcript", "_summary")
         output_path = os.path.join(output_folder, output_file_name)
 
-        # Check if summary already exists
-        if os.path.exists(output_path):
-            print(f"⏩ Summary already exists for {file_name}. Skipping...")
-            continue
-
-        print(f"🔹 Summarizing: {file_name}")
-
         with open(input_path, "r", encoding="utf-8") as f:
             text = f.read()
 
+        # Skip only when the summary was made from this exact transcript
+        digest = source_hash(text)
+        if is_current(output_path, digest):
+            print(f"⏩ Summary already up to date for {file_name}. Skipping...")
+            continue
+
         if not text.strip():
             print(f"⚠️ Empty transcript: {file_name}. Skipping.")
             continue
 
         chunks = chunk_text(text)
-        summaries = []
-        for i, chunk in enumerate(chunks):
-            summary = summarize_with_ollama(chunk)
-            summaries.append(summary)
-            print(f"  ✅ Chunk {i+1} summarized")
+        print(f"🔹 Summarizing: {file_name} ({len(chunks)} chunk(s))")
+        jobs[file_name] = {"output_path": output_path, "source_hash": digest, "chunks": chunks,
+                           "summaries": [None] * len(chunks), "done": 0}
+
+    if not jobs:
+        return result
+
+    # One call cache per output folder, so clearing it never drops another folder's pending retries
+    cache_folder = os.path.join(SUMMARY_CALL_CACHE_DIR, os.path.basename(os.path.normpath(output_folder)))
+
+    lesson_summaries = {}
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        futures = {
+            pool.submit(summarize_with_ollama, chunk, cache_folder): (file_name, i)
+            for file_name, job in jobs.items()
+            for i, chunk in enumerate(job["chunks"])
+        }
 
-        summary_text = "\n\n".join(summaries)
+        for done, future in enumerate(as_completed(futures), start=1):
+            file_name, i = futures[future]
+            job = jobs[file_name]
+            job["summaries"][i] = future.result()
+            job["done"] += 1
+            if progress:
+                progress(done, len(futures))
+            print(f"  ✅ {file_name}: chunk {i+1} summarized ({job['done']}/{len(job['chunks'])})")
 
+        # A summary with gaps would be skipped as done on the next run, so any failed chunk fails the file
+        mapped = {}
+        for file_name, job in jobs.items():
+            failed_chunks = job["summaries"].count(SUMMARY_FAILED)
+            if failed_chunks:
+                print(f"❌ {file_name}: {failed_chunks} of {len(job['summaries'])} chunk(s) failed to summarize. Skipping.")
+                result["failed"].append(file_name)
+                continue
+            mapped[file_name] = job["summaries"]
+
+        # Reduce every file in chunk order until it fits the target length
+        reduced, failed = reduce_summaries(mapped, pool, cache_folder=cache_folder)
+        result["failed"].extend(failed)
+
+    for file_name, summary_text in reduced.items():
+        output_path = jobs[file_name]["output_path"]
         with open(output_path, "w", encoding="utf-8") as f:
             f.write(summary_text)
-            if(isVideo):
-                update_lesson_summary_by_video_file(output_path, summary_text)
+        record_source(output_path, jobs[file_name]["source_hash"])
+        if(isVideo):
+            lesson_summaries[video_key(file_name)] = summary_text
+        result["summarized"] += 1
 
         print(f"✅ Saved summary to: {output_path}")
 
+    if not result["failed"]:
+        shutil.rmtree(cache_folder, ignore_errors=True)
+
+    if isVideo:
+        result["lessons"] = update_lesson_summaries(lesson_summaries, lesson_ids)
+    return result
+
 # # Step 5: Run summarization for video and module transcripts
 # print("\n🚀 Summarizing Video Transcripts...")
 # summarize_folder(video_transcripts_folder, video_summaries_folder)
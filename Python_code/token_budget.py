@@ -0,0 +1,60 @@
+import re
+import math
+
+# Rough token estimate for English text on llama/gemma tokenizers
+TOKENS_PER_WORD = 1.3
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+WORD = re.compile(r"\S+")
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text.split()) * TOKENS_PER_WORD)
+
+
+def split_sentences(text):
+    return [sentence for sentence in SENTENCE_END.split(text) if sentence.strip()]
+
+
+def pack_by_tokens(pieces, max_tokens, separator=" "):
+    """
+    Greedily pack pieces (sentences, paragraphs, summaries) into strings of at
+    most max_tokens. Each piece is measured once, so this is linear in the
+    input; a single piece larger than the budget is split on word boundaries.
+    """
+    max_words = max(1, int(max_tokens / TOKENS_PER_WORD))
+    chunks, current, current_tokens = [], [], 0
+
+    for piece in pieces:
+        words = piece.split()
+        tokens = math.ceil(len(words) * TOKENS_PER_WORD)
+
+        if tokens > max_tokens:
+            if current:
+                chunks.append(separator.join(current))
+                current, current_tokens = [], 0
+            chunks.extend(" ".join(words[i:i + max_words]) for i in range(0, len(words), max_words))
+            continue
+
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(separator.join(current))
+            current, current_tokens = [], 0
+
+        current.append(piece.strip())
+        current_tokens += tokens
+
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text after roughly max_tokens, keeping its original whitespace."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    max_words = max(1, int(max_tokens / TOKENS_PER_WORD))
+    for count, match in enumerate(WORD.finditer(text), start=1):
+        if count == max_words:
+            return text[:match.end()] + " …"
+    return text
@@ -1,14 +1,55 @@
 import os
+import re
+import json
 import whisper
 import subprocess
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-import PyPDF2
 from collections import defaultdict
+from video_caption_vtt import generate_vtt_from_video
+from pdf_pages import file_sha256, extract_text_from_pdf
 
-# Load Whisper model once
-print("🔄 Loading Whisper model...")
-model = whisper.load_model("base")
-print("✅ Whisper model loaded.")
+WHISPER_MODEL_NAME = os.getenv("WHISPER_MODEL", "base")
+# Parallel transcription: number of worker processes and torch threads per worker
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", "1"))
+TRANSCRIBE_TORCH_THREADS = int(os.getenv("TRANSCRIBE_TORCH_THREADS", "0"))
+
+# Audio is decoded by piping ffmpeg's output straight into numpy (no temp WAV files)
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
+SAMPLE_RATE = 16000
+AUDIO_BLOCK_SECONDS = 30
+
+# Long-media mode: lessons longer than this are split at silences and transcribed in parallel
+LONG_MEDIA_SECONDS = float(os.getenv("LONG_MEDIA_SECONDS", "1200"))
+LONG_MEDIA_CHUNK_SECONDS = float(os.getenv("LONG_MEDIA_CHUNK_SECONDS", "300"))
+LONG_MEDIA_SEARCH_SECONDS = float(os.getenv("LONG_MEDIA_SEARCH_SECONDS", "30"))
+LONG_MEDIA_WORKERS = int(os.getenv("LONG_MEDIA_WORKERS", str(max(2, (os.cpu_count() or 2) // 4))))
+# Decoded long-media chunks allowed to wait for a worker; bounds memory to about (this + 1) chunks
+LONG_MEDIA_PENDING_CHUNKS = int(os.getenv("LONG_MEDIA_PENDING_CHUNKS", str(LONG_MEDIA_WORKERS * 2)))
+
+# Content-addressed cache of Whisper results: sha256(media) + model name + whisper version
+TRANSCRIPT_CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR", "transcript_cache")
+
+# Whisper model, loaded once per process on first use
+model = None
+
+def get_model():
+    global model
+    if model is None:
+        print("🔄 Loading Whisper model...")
+        model = whisper.load_model(WHISPER_MODEL_NAME)
+        print("✅ Whisper model loaded.")
+    return model
+
+def init_transcription_worker(torch_threads):
+    """Process-pool initializer: pin torch threads and load Whisper once per worker."""
+    import torch
+    if torch_threads > 0:
+        torch.set_num_threads(torch_threads)
+    get_model()
 
 def get_file_type(file_path):
     ext = file_path.lower().split('.')[-1]
@@ -22,117 +63,499 @@ def get_file_type(file_path):
     else:
         return 'unsupported'
 
-def extract_text_from_pdf(pdf_path):
-    print(f"📄 Extracting text from PDF: {pdf_path}")
-    text = ""
+def iter_audio_blocks(input_path, block_seconds=AUDIO_BLOCK_SECONDS):
+    """
+    Decode any ffmpeg-readable file to 16 kHz mono and yield it as int16 numpy
+    blocks of at most `block_seconds`, straight from ffmpeg's stdout. Nothing is
+    written to disk and only one block of raw PCM is held at a time.
+    """
+    command = [
+        FFMPEG_PATH, "-nostdin", "-threads", "0", "-i", input_path,
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "-"
+    ]
+    block_bytes = int(block_seconds * SAMPLE_RATE) * 2
+
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            raw = process.stdout.read(block_bytes)
+            if not raw:
+                break
+            yield np.frombuffer(raw, dtype=np.int16)
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+
+    if returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to decode {input_path} (exit code {returncode})")
+
+def load_audio(input_path):
+    """
+    Decode a media file into the float32 16 kHz mono array Whisper accepts.
+    Blocks are kept as int16 until the end, so peak memory is about 1.5x the
+    final array rather than raw bytes + int16 + float32 copies. Memory still
+    grows with the media length; long media goes through iter_silence_chunks.
+    """
+    print(f"🎞️ Decoding audio: {input_path}")
+    blocks = list(iter_audio_blocks(input_path))
+
+    audio = np.empty(sum(len(block) for block in blocks), dtype=np.float32)
+    offset = 0
+    for i, block in enumerate(blocks):
+        blocks[i] = None  # release each int16 block as soon as it is converted
+        np.divide(block, 32768.0, out=audio[offset:offset + len(block)])
+        offset += len(block)
+
+    print(f"🔊 Decoded {len(audio) / SAMPLE_RATE:.1f}s of audio")
+    return audio
+
+def transcribe_with_whisper(audio):
+    """
+    Single Whisper pass over a file path or a decoded 16 kHz float32 array.
+    Returns {"text", "segments"} so the plain transcript and the timestamped
+    captions come from the same result; a failed pass also carries "error".
+    """
+    print(f"🧠 Transcribing with Whisper: {audio if isinstance(audio, str) else f'{len(audio) / SAMPLE_RATE:.1f}s of audio'}")
     try:
-        with open(pdf_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            for i, page in enumerate(reader.pages):
-                page_text = page.extract_text()
-                print(f"   🔸 Page {i + 1} text length: {len(page_text) if page_text else 0}")
-                if page_text:
-                    text += page_text + "\n"
+        result = get_model().transcribe(audio)
+        print(f"📝 Transcription result length: {len(result['text'])}")
+        return {
+            "text": result["text"].strip(),
+            "segments": [
+                {"start": seg["start"], "end": seg["end"], "text": seg["text"]}
+                for seg in result["segments"]
+            ]
+        }
     except Exception as e:
-        print(f"❌ Error extracting PDF text: {e}")
-    return text.strip()
+        print(f"❌ Error transcribing audio: {e}")
+        return {"text": "", "segments": [], "error": str(e)}
+
+def media_duration(input_path):
+    """Duration in seconds from ffmpeg's header probe, or None if it can't be read."""
+    try:
+        probe = subprocess.run([FFMPEG_PATH, "-nostdin", "-i", input_path],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, errors="ignore")
+    except OSError:
+        return None
+    match = re.search(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)", probe.stderr)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def quietest_point(audio, low, high, frame, smooth_frames):
+    """Sample index of the quietest frame (smoothed RMS energy) in audio[low:high]."""
+    frames = (high - low) // frame
+    window = audio[low:low + frames * frame].reshape(frames, frame)
+    energy = np.sqrt(np.mean(window * window, axis=1))
+    energy = np.convolve(energy, np.ones(smooth_frames) / smooth_frames, mode="same")
+    return low + int(np.argmin(energy)) * frame + frame // 2
+
+def iter_silence_chunks(blocks, chunk_seconds=LONG_MEDIA_CHUNK_SECONDS, search_seconds=LONG_MEDIA_SEARCH_SECONDS,
+                        frame_ms=30, smooth_frames=10):
+    """
+    Cut a stream of int16 audio blocks (see iter_audio_blocks) into float32
+    pieces of roughly chunk_seconds, at the quietest point within
+    +/- search_seconds of each target. Yields (start_sample, chunk) as the
+    audio arrives; only about chunk_seconds + search_seconds is buffered.
+    """
+    chunk = int(chunk_seconds * SAMPLE_RATE)
+    search = int(search_seconds * SAMPLE_RATE)
+    frame = int(SAMPLE_RATE * frame_ms / 1000)
+
+    pending, buffered, start = [], 0, 0
+    for block in blocks:
+        pending.append(block.astype(np.float32) / 32768.0)
+        buffered += len(block)
+        if buffered <= chunk + search:
+            continue
 
-def convert_to_wav(input_path, output_label):
-    output_path = f"{output_label}.wav"
-    default_ffmpeg = "ffmpeg"
-   # custom_ffmpeg = "C:/Users/yravi/Documents/ffmpeg-7.1.1-essentials_build/bin/ffmpeg.exe"
-    ffmpeg_path = custom_ffmpeg if os.path.exists(default_ffmpeg) else default_ffmpeg
+        audio = np.concatenate(pending)
+        while len(audio) > chunk + search:
+            cut = quietest_point(audio, chunk - search, chunk + search, frame, smooth_frames)
+            yield start, audio[:cut]
+            start += cut
+            audio = audio[cut:].copy()
+        pending, buffered = [audio], len(audio)
 
-    print(f"🎞️ Converting to WAV: {input_path} -> {output_path}")
+    if buffered:
+        yield start, np.concatenate(pending)
+
+def transcribe_in_chunks(input_path, pool, max_pending=LONG_MEDIA_PENDING_CHUNKS):
+    """
+    Long-media path: decode the file window by window, cut it at silences as
+    it streams, transcribe the pieces in `pool`, then stitch text and segments
+    back together with timestamps shifted to the original timeline. Decoding
+    pauses while max_pending chunks wait for a worker, so memory is bounded by
+    the chunk size rather than the length of the lecture.
+
+    If any chunk fails the result carries "error", so the caller never caches
+    a transcript with a missing span.
+    """
+    print(f"✂️ Long media: streaming {input_path} in ~{LONG_MEDIA_CHUNK_SECONDS:.0f}s chunks")
+
+    futures, samples = [], 0
+    for start, chunk in iter_silence_chunks(iter_audio_blocks(input_path)):
+        outstanding = [future for _, future in futures if not future.done()]
+        if len(outstanding) >= max_pending:
+            wait(outstanding, return_when=FIRST_COMPLETED)
+        futures.append((start, pool.submit(transcribe_with_whisper, chunk)))
+        samples = start + len(chunk)
+
+    print(f"🔊 Long media: {samples / SAMPLE_RATE:.0f}s split into {len(futures)} chunk(s)")
+
+    texts, segments, failed = [], [], []
+    for start, future in futures:
+        try:
+            piece = future.result()
+        except BrokenProcessPool:
+            # A worker died; the caller retries the lesson in a fresh pool
+            raise
+        except Exception as e:
+            piece = {"text": "", "segments": [], "error": str(e)}
+        if piece.get("error"):
+            failed.append(f"chunk at {start / SAMPLE_RATE:.0f}s: {piece['error']}")
+            continue
+
+        offset = start / SAMPLE_RATE
+        if piece["text"]:
+            texts.append(piece["text"])
+        segments.extend(
+            {"start": seg["start"] + offset, "end": seg["end"] + offset, "text": seg["text"]}
+            for seg in piece["segments"]
+        )
+
+    if failed:
+        print(f"❌ {len(failed)} of {len(futures)} long-media chunk(s) failed")
+        return {"text": "", "segments": [], "error": f"{len(failed)} of {len(futures)} chunk(s) failed ({'; '.join(failed)})"}
+    return {"text": " ".join(texts), "segments": segments}
+
+def resolve_lesson_path(relative_path):
+    """Map a lesson's stored URL path to (relative OS path, absolute path) under the LMS folder."""
+    path = relative_path.strip("/").replace("/", os.sep)
+
+    # Get base directory (i.e., LMS folder)
+    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+    # Join to form the correct absolute path
+    return path, os.path.join(base_dir, path)
+
+def transcript_cache_key(full_path):
+    """Hash of the media bytes plus the model that would transcribe them."""
+    digest = file_sha256(full_path)
+    digest.update(f"|{WHISPER_MODEL_NAME}|{getattr(whisper, '__version__', 'unknown')}".encode("utf-8"))
+    return digest.hexdigest()
+
+def transcript_cache_path(cache_key):
+    return os.path.join(TRANSCRIPT_CACHE_DIR, f"{cache_key}.json")
+
+def load_cached_transcription(cache_key):
     try:
-        command = [ffmpeg_path, "-y", "-i", input_path, output_path]
-        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Error converting file: {e}")
+        with open(transcript_cache_path(cache_key), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
         return None
-    return output_path
 
-def transcribe_with_whisper(audio_path):
-    print(f"🧠 Transcribing with Whisper: {audio_path}")
+def save_cached_transcription(cache_key, transcription):
+    os.makedirs(TRANSCRIPT_CACHE_DIR, exist_ok=True)
+    cache_path = transcript_cache_path(cache_key)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(transcription, f, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
+
+def write_if_changed(file_path, text):
+    """Write text to file_path unless it already holds exactly that text."""
     try:
-        result = model.transcribe(audio_path)
-        print(f"📝 Transcription result length: {len(result['text'])}")
-        return result["text"].strip()
+        with open(file_path, "r", encoding="utf-8") as f:
+            if f.read() == text:
+                return False
+    except FileNotFoundError:
+        pass
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return True
+
+def transcribe_media_file(input_path):
+    """Decode a whole file and transcribe it in one Whisper pass (short media)."""
+    return transcribe_with_whisper(load_audio(input_path))
+
+def transcribe_lesson(item, caption_folder=None, transcribe=transcribe_media_file):
+    """
+    Transcribe one lesson and save its individual transcript (and captions).
+    Returns {"module_id", "position", "name", "text", "error", "cache"}; errors
+    are reported in the result rather than raised so one bad file never stops
+    a batch. "cache" is "hit" or "miss" for media files, None otherwise.
+    `transcribe` maps a media file path to {"text", "segments"}.
+    """
+    module_id = item["module_id"]
+    position = item["position"]
+    relative_path = item["path"]
+    path, full_path = resolve_lesson_path(relative_path)
+
+    print(f"full_path {full_path}")
+
+    file_type = get_file_type(full_path)
+
+    print(f"  🔹 Position {position} - {path} ({file_type})")
+
+    lesson = {"module_id": module_id, "position": position, "path": relative_path,
+              "name": Path(path).name, "text": "", "error": None, "cache": None}
+
+    try:
+        text = ""
+        if file_type == 'pdf':
+            text = extract_text_from_pdf(full_path)
+
+        elif file_type in ['audio', 'video']:
+            cache_key = item.get("cache_key") or transcript_cache_key(full_path)
+            transcription = load_cached_transcription(cache_key)
+
+            if transcription is not None:
+                print(f"♻️ Transcript cache hit for {path}")
+                lesson["cache"] = "hit"
+            else:
+                lesson["cache"] = "miss"
+                try:
+                    transcription = transcribe(full_path)
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    print(f"❌ Error decoding file: {e}")
+                    transcription = None
+
+                if transcription is not None and transcription.get("error"):
+                    # Incomplete results are never cached, so the next run transcribes again
+                    raise RuntimeError(f"Transcription failed: {transcription['error']}")
+                if transcription is not None:
+                    # Empty results are cached too: a silent or music-only video has no speech to find
+                    save_cached_transcription(cache_key, transcription)
+
+            if transcription is not None:
+                text = transcription["text"]
+
+                if caption_folder and transcription["segments"]:
+                    generate_vtt_from_video(relative_path, caption_folder, segments=transcription["segments"])
+            else:
+                text = f"[Error: Conversion failed for {relative_path}]"
+
+        else:
+            text = f"[Unsupported file type: {relative_path}]"
+
+        # 📄 Save individual transcript (left untouched when unchanged)
+        filename = Path(path).stem
+        individual_transcript_path = os.path.join("video_transcripts", f"{filename}_transcript.txt")
+        if write_if_changed(individual_transcript_path, text):
+            print(f"✅ Saved individual transcript: {individual_transcript_path}")
+
+        lesson["text"] = text
+
+    except BrokenProcessPool:
+        raise
     except Exception as e:
-        print(f"❌ Error transcribing audio: {e}")
-        return ""
+        print(f"❌ Error processing {path}: {e}")
+        lesson["error"] = str(e)
+
+    return lesson
+
+def make_transcription_pool(workers, torch_threads):
+    """
+    Spawn-based process pool whose workers each load Whisper once. Spawn
+    children re-import __main__; app.py does no work at import time, so a
+    worker loads only the transcription code it unpickles.
+    """
+    if torch_threads <= 0:
+        torch_threads = max(1, (os.cpu_count() or 1) // workers)
+
+    print(f"⚙️ Starting {workers} transcription worker(s), {torch_threads} torch thread(s) each")
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_transcription_worker,
+        initargs=(torch_threads,)
+    )
+
+def failed_lesson(item, error):
+    return {
+        "module_id": item["module_id"],
+        "position": item["position"],
+        "path": item["path"],
+        "name": Path(item["path"]).name,
+        "text": "",
+        "error": str(error),
+        "cache": "miss"
+    }
+
+def transcribe_lessons_in_parallel(short_items, long_items, caption_folder, make_pool, on_lesson=None):
+    """
+    Short lessons go to the pool whole; long lessons are streamed through
+    ffmpeg here and their silence-split chunks are fanned out to the same pool. Results come back unordered.
+    on_lesson() is called as each lesson finishes.
 
-def generate_transcripts(incoming_data, transcript_folder="module_transcripts"):
+    A worker that dies outright (OOM kill, segfault) breaks the whole pool and
+    every lesson still in it. Those lessons are retried one at a time in a
+    fresh pool (make_pool() builds one), so only a lesson that crashes its
+    worker again is recorded as failed.
+    """
+    on_lesson = on_lesson or (lambda: None)
+    lessons, retry = [], []
+
+    pool = make_pool()
+    try:
+        futures = {pool.submit(transcribe_lesson, item, caption_folder): item for item in short_items}
+
+        for item in long_items:
+            try:
+                lessons.append(transcribe_lesson(item, caption_folder,
+                                                 transcribe=lambda path: transcribe_in_chunks(path, pool)))
+            except BrokenProcessPool:
+                retry.append((item, True))
+                continue
+            except Exception as e:
+                print(f"❌ Long-media transcription failed on {item['path']}: {e}")
+                lessons.append(failed_lesson(item, e))
+            on_lesson()
+
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                lessons.append(future.result())
+            except BrokenProcessPool:
+                retry.append((item, False))
+                continue
+            except Exception as e:
+                print(f"❌ Worker failed on {item['path']}: {e}")
+                lessons.append(failed_lesson(item, e))
+            on_lesson()
+    finally:
+        pool.shutdown()
+
+    if retry:
+        print(f"⚠️ A transcription worker died; retrying {len(retry)} lesson(s) one at a time")
+
+    pool = None
+    try:
+        for item, is_long in retry:
+            if pool is None:
+                pool = make_pool()
+            try:
+                if is_long:
+                    lesson = transcribe_lesson(item, caption_folder,
+                                               transcribe=lambda path: transcribe_in_chunks(path, pool))
+                else:
+                    lesson = pool.submit(transcribe_lesson, item, caption_folder).result()
+            except BrokenProcessPool as e:
+                print(f"❌ Worker crashed on {item['path']}: {e}")
+                lesson = failed_lesson(item, f"transcription worker crashed: {e}")
+                pool.shutdown()
+                pool = None
+            except Exception as e:
+                print(f"❌ Worker failed on {item['path']}: {e}")
+                lesson = failed_lesson(item, e)
+            lessons.append(lesson)
+            on_lesson()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return lessons
+
+def generate_transcripts(incoming_data, transcript_folder="module_transcripts", caption_folder=None,
+                         workers=TRANSCRIBE_WORKERS, torch_threads=TRANSCRIBE_TORCH_THREADS, progress=None):
+    """
+    Transcribe every lesson once, writing the per-video transcript, the
+    combined module transcript and (when caption_folder is given) the VTT
+    captions from the same Whisper result. With workers > 1 lessons are
+    transcribed in a process pool and reassembled in position order.
+    Media longer than LONG_MEDIA_SECONDS is split at silences and its chunks
+    are transcribed in parallel (with at least LONG_MEDIA_WORKERS workers).
+
+    Media already in the transcript cache is never re-transcribed. Returns
+    {"lessons", "errors", "failed", "cache_hits", "cache_misses"}, where
+    failed lists {"path", "error"} for each lesson that failed. progress(done, total)
+    is called as lessons finish.
+    """
     print(f"🧾 Generating transcripts in: {transcript_folder}")
 
     # Ensure output directories exist
     os.makedirs(transcript_folder, exist_ok=True)
     os.makedirs("video_transcripts", exist_ok=True)
 
-    # Sort and group data
-    sorted_data = sorted(incoming_data, key=lambda x: (x["module_id"], x["position"]))
-    modules = defaultdict(list)
-    for item in sorted_data:
-        modules[item["module_id"]].append(item)
-
-    for module_id, files in modules.items():
-        print(f"\n📁 Processing Module {module_id} with {len(files)} files...")
-        combined_text = ""
-
-        for item in files: 
-            position = item["position"]
-            relative_path = item["path"]
-            path = relative_path.strip("/").replace("/", os.sep)
+    # Resolve cache hits up front so only changed media reaches Whisper (and the pool)
+    cached, pending = [], []
+    for item in incoming_data:
+        _, full_path = resolve_lesson_path(item["path"])
+        if get_file_type(full_path) in ['audio', 'video'] and os.path.exists(full_path):
+            item = dict(item, cache_key=transcript_cache_key(full_path))
+            if os.path.exists(transcript_cache_path(item["cache_key"])):
+                cached.append(item)
+                continue
+        pending.append(item)
 
-            # Get base directory (i.e., LMS folder)
-            base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    print(f"♻️ {len(cached)} lesson(s) found in transcript cache, {len(pending)} to process")
+    lessons = [transcribe_lesson(item, caption_folder) for item in cached]
 
-            # Join to form the correct absolute path
-            full_path = os.path.join(base_dir, path)
+    if progress:
+        progress(len(lessons), len(incoming_data))
 
-            print(f"full_path {full_path}")
+    # Long lectures get segment-level parallelism
+    short_items, long_items = [], []
+    for item in pending:
+        duration = media_duration(resolve_lesson_path(item["path"])[1]) if "cache_key" in item else None
+        if duration is not None and duration > LONG_MEDIA_SECONDS:
+            print(f"⏱️ {item['path']} is {duration:.0f}s long; using long-media mode")
+            long_items.append(item)
+        else:
+            short_items.append(item)
 
-            file_type = get_file_type(full_path)
+    pool_size = max(workers, LONG_MEDIA_WORKERS) if long_items else workers
+    if pool_size > 1 and (long_items or len(short_items) > 1):
+        done = [len(lessons)]
 
-            print(f"  🔹 Position {position} - {path} ({file_type})")
+        def on_lesson():
+            done[0] += 1
+            if progress:
+                progress(done[0], len(incoming_data))
 
-            try:
-                text = ""
-                if file_type == 'pdf':
-                    text = extract_text_from_pdf(path)
-
-                elif file_type in ['audio', 'video']:
-                    wav_label = f"temp_module{module_id}_pos{position}"
-                    wav_path = convert_to_wav(full_path, wav_label)
-                    if wav_path:
-                        text = transcribe_with_whisper(wav_path)
-                        os.remove(wav_path)
-                        print(f"🧹 Removed temporary WAV: {wav_path}")
-                    else:
-                        text = f"[Error: Conversion failed for {relative_path}]"
+        lessons += transcribe_lessons_in_parallel(short_items, long_items, caption_folder,
+                                                  lambda: make_transcription_pool(pool_size, torch_threads),
+                                                  on_lesson)
+    else:
+        for item in pending:
+            lessons.append(transcribe_lesson(item, caption_folder))
+            if progress:
+                progress(len(lessons), len(incoming_data))
 
-                else:
-                    text = f"[Unsupported file type: {relative_path}]"
+    # Sort and group results
+    modules = defaultdict(list)
+    for lesson in sorted(lessons, key=lambda x: (x["module_id"], x["position"])):
+        modules[lesson["module_id"]].append(lesson)
 
-                # 📄 Save individual transcript
-                filename = Path(path).stem
-                individual_transcript_path = os.path.join("video_transcripts", f"{filename}_transcript.txt")
-                with open(individual_transcript_path, "w", encoding="utf-8") as f:
-                    f.write(text)
-                print(f"✅ Saved individual transcript: {individual_transcript_path}")
+    for module_id, module_lessons in modules.items():
+        print(f"\n📁 Assembling Module {module_id} from {len(module_lessons)} files...")
+        parts = []
 
+        for lesson in module_lessons:
+            if lesson["error"]:
+                parts.append(f"⚠️ Error processing {lesson['path']}: {lesson['error']}\n")
+            else:
                 # 📌 Add to combined text for module
-                combined_text += f"📌 Position {position} - {Path(path).name}\n"
-                combined_text += text + "\n"
-                combined_text += "-" * 40 + "\n\n"
-
-            except Exception as e:
-                print(f"❌ Error processing {path}: {e}")
-                combined_text += f"⚠️ Error processing {relative_path}: {str(e)}\n"
-                combined_text += "-" * 40 + "\n\n"
+                parts.append(f"📌 Position {lesson['position']} - {lesson['name']}\n")
+                parts.append(lesson["text"] + "\n")
+            parts.append("-" * 40 + "\n\n")
 
         # Save combined module transcript
         transcript_path = os.path.join(transcript_folder, f"module{module_id}_transcript.txt")
-        with open(transcript_path, "w", encoding="utf-8") as f:
-            f.write(combined_text)
-        print(f"✅ Saved combined module transcript: {transcript_path}")
+        if write_if_changed(transcript_path, "".join(parts)):
+            print(f"✅ Saved combined module transcript: {transcript_path}")
+        else:
+            print(f"⏩ Module transcript unchanged: {transcript_path}")
+
+    stats = {
+        "lessons": len(lessons),
+        "errors": sum(1 for lesson in lessons if lesson["error"]),
+        "failed": [{"path": lesson["path"], "error": lesson["error"]} for lesson in lessons if lesson["error"]],
+        "cache_hits": sum(1 for lesson in lessons if lesson["cache"] == "hit"),
+        "cache_misses": sum(1 for lesson in lessons if lesson["cache"] == "miss")
+    }
+    print(f"📊 Transcripts: {stats}")
+    return stats
@@ -0,0 +1,208 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import numpy as np
+from token_budget import estimate_tokens, split_sentences, pack_by_tokens
+
+# Where per-module chunk embeddings are kept and how transcripts are cut up
+TRANSCRIPT_INDEX_DIR = os.getenv("TRANSCRIPT_INDEX_DIR", "transcript_index")
+TRANSCRIPT_CHUNK_TOKENS = int(os.getenv("TRANSCRIPT_CHUNK_TOKENS", "200"))
+TRANSCRIPT_INDEX_DTYPE = os.getenv("TRANSCRIPT_INDEX_DTYPE", "float16")
+
+# Lesson sections as written by transcript_generator.generate_transcripts
+LESSON_HEADER = re.compile(r"^📌 Position (\S+) - (.*)$")
+SECTION_RULE = "-" * 40
+
+
+def text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def split_transcript(text, max_tokens=TRANSCRIPT_CHUNK_TOKENS):
+    """
+    Split a combined module transcript into chunks of at most max_tokens,
+    never crossing a lesson boundary. Returns [{"lesson", "text"}].
+    """
+    chunks = []
+    for section in text.split(SECTION_RULE):
+        lines = section.strip().splitlines()
+        if not lines or lines[0].startswith("⚠️ Error processing"):
+            continue
+
+        lesson = ""
+        header = LESSON_HEADER.match(lines[0])
+        if header:
+            lesson = header.group(2).strip()
+            lines = lines[1:]
+
+        body = " ".join(line.strip() for line in lines if line.strip())
+        for chunk in pack_by_tokens(split_sentences(body), max_tokens):
+            chunks.append({"lesson": lesson, "text": chunk})
+    return chunks
+
+
+class TranscriptChunkIndex:
+    """
+    Embedded chunks of each module transcript, for picking the parts of a
+    module relevant to a chat question.
+
+    Each module is stored as module<id>/chunks.json (transcript hash plus chunk
+    text and hashes) and module<id>/vectors.npy (L2-normalised embeddings).
+    When a transcript changes only chunks whose text changed are re-encoded;
+    a module indexed by a different model is re-encoded in full.
+    """
+
+    def __init__(self, model, transcript_folder="module_transcripts", folder=TRANSCRIPT_INDEX_DIR,
+                 chunk_tokens=TRANSCRIPT_CHUNK_TOKENS, dtype=TRANSCRIPT_INDEX_DTYPE, model_name=None):
+        self.model = model
+        self.model_name = model_name
+        self.transcript_folder = transcript_folder
+        self.folder = folder
+        self.chunk_tokens = chunk_tokens
+        self.dtype = np.dtype(dtype)
+        # self.lock only guards the dicts; rebuilding a module holds just that module's lock
+        self.lock = threading.Lock()
+        self.module_locks = {}
+        # module_id -> {"mtime", "source_hash", "chunks", "vectors"}
+        self.modules = {}
+
+    def transcript_path(self, module_id):
+        return os.path.join(self.transcript_folder, f"module{module_id}_transcript.txt")
+
+    def module_folder(self, module_id):
+        return os.path.join(self.folder, f"module{module_id}")
+
+    def load_module(self, module_id):
+        folder = self.module_folder(module_id)
+        try:
+            with open(os.path.join(folder, "chunks.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("model") != self.model_name:
+                print(f"⚠️ Chunk index for module {module_id} was built with model {meta.get('model')!r}. Rebuilding.")
+                return None
+            vectors = np.load(os.path.join(folder, "vectors.npy"))
+            if len(vectors) != len(meta["chunks"]):
+                print(f"⚠️ Chunk index for module {module_id} is inconsistent. Rebuilding.")
+                return None
+            return {"mtime": None, "source_hash": meta["source_hash"], "chunks": meta["chunks"], "vectors": vectors}
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"❌ Failed to load chunk index for module {module_id}: {e}")
+            return None
+
+    def save_module(self, module_id, entry):
+        folder = self.module_folder(module_id)
+        os.makedirs(folder, exist_ok=True)
+
+        tmp_vectors = os.path.join(folder, "vectors.tmp.npy")
+        tmp_meta = os.path.join(folder, "chunks.json.tmp")
+        np.save(tmp_vectors, entry["vectors"])
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_name, "source_hash": entry["source_hash"], "chunks": entry["chunks"]}, f,
+                      ensure_ascii=False)
+        os.replace(tmp_vectors, os.path.join(folder, "vectors.npy"))
+        os.replace(tmp_meta, os.path.join(folder, "chunks.json"))
+
+    def module_lock(self, module_id):
+        with self.lock:
+            return self.module_locks.setdefault(module_id, threading.Lock())
+
+    def sync(self, module_id):
+        """
+        Bring the index for a module up to date with its transcript file and
+        return the entry, or None if the module has no transcript. Only
+        requests for the same module wait while it is re-indexed.
+        """
+        module_id = str(module_id)
+        path = self.transcript_path(module_id)
+        with self.module_lock(module_id):
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                with self.lock:
+                    self.modules.pop(module_id, None)
+                return None
+
+            with self.lock:
+                entry = self.modules.get(module_id)
+            if entry is not None and entry["mtime"] == mtime:
+                return entry
+
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            source_hash = text_hash(text)
+
+            if entry is None:
+                entry = self.load_module(module_id)
+            if entry is not None and entry["source_hash"] == source_hash:
+                entry = dict(entry, mtime=mtime)
+            else:
+                entry = self.rebuild(module_id, text, source_hash, entry)
+                entry["mtime"] = mtime
+
+            with self.lock:
+                self.modules[module_id] = entry
+            return entry
+
+    def rebuild(self, module_id, text, source_hash, previous):
+        chunks = split_transcript(text, self.chunk_tokens)
+        for chunk in chunks:
+            chunk["hash"] = text_hash(chunk["lesson"] + "\n" + chunk["text"])
+
+        # Reuse vectors of chunks that survived the edit unchanged
+        reusable = {}
+        if previous is not None:
+            for row, chunk in enumerate(previous["chunks"]):
+                reusable.setdefault(chunk["hash"], previous["vectors"][row])
+
+        dim = self.model.get_sentence_embedding_dimension()
+        vectors = np.zeros((len(chunks), dim), dtype=self.dtype)
+        stale = [row for row, chunk in enumerate(chunks) if chunk["hash"] not in reusable]
+        for row, chunk in enumerate(chunks):
+            if chunk["hash"] in reusable:
+                vectors[row] = reusable[chunk["hash"]]
+
+        if stale:
+            encoded = self.model.encode(
+                [chunks[row]["text"] for row in stale],
+                normalize_embeddings=True,
+                show_progress_bar=False
+            )
+            vectors[stale] = np.asarray(encoded, dtype=self.dtype)
+
+        entry = {"source_hash": source_hash, "chunks": chunks, "vectors": vectors}
+        self.save_module(module_id, entry)
+        print(f"🧩 Indexed module {module_id}: {len(chunks)} chunks ({len(stale)} encoded, {len(chunks) - len(stale)} reused)")
+        return entry
+
+    def search(self, module_id, question, top_k=6, max_tokens=1500, query=None):
+        """
+        The most relevant chunks for a question, best first, keeping at most
+        top_k chunks and max_tokens in total. Returns [] if there is no index.
+        Pass query to reuse an already computed question embedding.
+        """
+        entry = self.sync(module_id)
+        if entry is None or not entry["chunks"]:
+            return []
+
+        if query is None:
+            query = self.model.encode([question], normalize_embeddings=True, show_progress_bar=False)[0]
+        query = np.asarray(query, dtype=np.float32)
+        scores = entry["vectors"].astype(np.float32) @ query
+
+        k = min(len(scores), max(1, top_k))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+
+        selected, used = [], 0
+        for row in best:
+            chunk = entry["chunks"][row]
+            tokens = estimate_tokens(chunk["text"])
+            if used + tokens > max_tokens:
+                continue
+            selected.append({**chunk, "row": int(row), "score": float(scores[row])})
+            used += tokens
+        return selected
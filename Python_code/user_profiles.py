@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+
+USER_PROFILE_DIR = os.getenv("USER_PROFILE_DIR", "user_profiles")
+# Fold the journal into a fresh snapshot after this many enrollment changes
+USER_PROFILE_JOURNAL_LIMIT = int(os.getenv("USER_PROFILE_JOURNAL_LIMIT", "1000"))
+# Reconcile a stored profile with the enrollments table at most this often per user
+USER_PROFILE_RESYNC_SECONDS = int(os.getenv("USER_PROFILE_RESYNC_SECONDS", "86400"))
+
+
+class UserProfileStore:
+    """
+    Per-user recommendation profiles kept as (sum of enrolled course embeddings,
+    enrolled course ids). Adding or removing an enrollment is an O(d) update.
+
+    Only enrollment ids are persisted: a snapshot (enrollments.json) plus an
+    append-only journal (journal.jsonl) of changes since that snapshot. Sums are
+    rebuilt lazily from the CourseEmbeddingStore, and again whenever one of the
+    user's courses is re-encoded. The Node server reports every enrollment
+    change, so the stored ids are trusted and only reconciled with the database
+    every resync_seconds (see needs_resync).
+    """
+
+    def __init__(self, embedding_store, folder=USER_PROFILE_DIR, journal_limit=USER_PROFILE_JOURNAL_LIMIT,
+                 resync_seconds=USER_PROFILE_RESYNC_SECONDS):
+        self.embedding_store = embedding_store
+        self.folder = folder
+        self.journal_limit = journal_limit
+        self.resync_seconds = resync_seconds
+        self.lock = threading.RLock()
+        self.enrolled = {}
+        self.sums = {}
+        # user_id -> when this process last loaded the user's enrollments from the database
+        self.synced_at = {}
+        self.journal_size = 0
+        self.load()
+
+    @property
+    def snapshot_path(self):
+        return os.path.join(self.folder, "enrollments.json")
+
+    @property
+    def journal_path(self):
+        return os.path.join(self.folder, "journal.jsonl")
+
+    def load(self):
+        try:
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                    snapshot = json.load(f)
+                self.enrolled = {int(uid): set(cids) for uid, cids in snapshot.items()}
+
+            if os.path.exists(self.journal_path):
+                with open(self.journal_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            self.apply(json.loads(line))
+                            self.journal_size += 1
+
+            print(f"✅ Loaded enrollment profiles for {len(self.enrolled)} user(s) from {self.folder}")
+        except Exception as e:
+            print(f"❌ Failed to load user profiles, starting empty: {e}")
+            self.enrolled, self.sums, self.journal_size = {}, {}, 0
+
+    def apply(self, entry):
+        user_id = int(entry["user_id"])
+        if entry["op"] == "set":
+            self.enrolled[user_id] = set(entry["course_ids"])
+        elif entry["op"] == "add" and user_id in self.enrolled:
+            self.enrolled[user_id].add(entry["course_id"])
+        elif entry["op"] == "remove" and user_id in self.enrolled:
+            self.enrolled[user_id].discard(entry["course_id"])
+
+    def record(self, entry):
+        os.makedirs(self.folder, exist_ok=True)
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        self.journal_size += 1
+
+        if self.journal_size >= self.journal_limit:
+            self.compact()
+
+    def compact(self):
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({str(uid): sorted(cids) for uid, cids in self.enrolled.items()}, f)
+        os.replace(tmp_path, self.snapshot_path)
+        open(self.journal_path, "w").close()
+        self.journal_size = 0
+
+    def course_vector(self, course_id):
+        row = self.embedding_store.row_of.get(course_id)
+        if row is None:
+            return None
+        return self.embedding_store.vectors[row].astype(np.float32)
+
+    def get(self, user_id, accessible_ids=None):
+        """
+        (unit profile vector, enrolled course ids) for a known user, with a None
+        vector if they have no enrollments. Returns None when the user is unknown
+        or one of their courses has no cached embedding yet.
+
+        With accessible_ids, the vector only counts enrollments in those courses
+        (as /recommend/batch does); the returned ids are always the full set.
+        """
+        with self.lock, self.embedding_store.lock:
+            enrolled = self.enrolled.get(user_id)
+            if enrolled is None:
+                return None
+            if not enrolled:
+                return None, set()
+
+            store = self.embedding_store
+            rows = [store.row_of.get(cid) for cid in enrolled]
+            if any(row is None for row in rows):
+                return None
+
+            cached = self.sums.get(user_id)
+            if cached is None or (cached[1] < store.revision and (store.row_revisions[rows] > cached[1]).any()):
+                cached = (store.vectors[rows].astype(np.float32).sum(axis=0), store.revision)
+                self.sums[user_id] = cached
+
+            total = cached[0]
+            if accessible_ids is not None:
+                excluded = [row for cid, row in zip(enrolled, rows) if cid not in accessible_ids]
+                if len(excluded) == len(rows):
+                    return None, set(enrolled)
+                if excluded:
+                    total = total - store.vectors[excluded].astype(np.float32).sum(axis=0)
+
+            profile = total / max(np.linalg.norm(total), 1e-12)
+            return profile, set(enrolled)
+
+    def needs_resync(self, user_id):
+        """
+        True when the user's enrollments haven't been loaded from the database
+        by this process within resync_seconds, as a backstop for lost updates.
+        """
+        with self.lock:
+            synced_at = self.synced_at.get(user_id)
+            return synced_at is None or time.time() - synced_at > self.resync_seconds
+
+    def set_enrollments(self, user_id, course_ids):
+        """
+        Replace a user's enrollments wholesale with the database's (first sight
+        of a user, or a resync). Only journalled when something changed.
+        """
+        with self.lock:
+            course_ids = set(course_ids)
+            self.synced_at[user_id] = time.time()
+            if self.enrolled.get(user_id) == course_ids:
+                return
+            self.enrolled[user_id] = course_ids
+            self.sums.pop(user_id, None)
+            self.record({"op": "set", "user_id": user_id, "course_ids": sorted(course_ids)})
+
+    def add_enrollment(self, user_id, course_id):
+        """
+        Record a new enrollment. Users without a profile yet are left alone; their
+        full enrollment list is loaded from the database on their next /recommend.
+        """
+        with self.lock:
+            enrolled = self.enrolled.get(user_id)
+            if enrolled is None or course_id in enrolled:
+                return
+            enrolled.add(course_id)
+            self.update_sum(user_id, course_id, 1.0)
+            self.record({"op": "add", "user_id": user_id, "course_id": course_id})
+
+    def remove_enrollment(self, user_id, course_id):
+        with self.lock:
+            enrolled = self.enrolled.get(user_id)
+            if enrolled is None or course_id not in enrolled:
+                return
+            enrolled.discard(course_id)
+            self.update_sum(user_id, course_id, -1.0)
+            self.record({"op": "remove", "user_id": user_id, "course_id": course_id})
+
+    def update_sum(self, user_id, course_id, sign):
+        cached = self.sums.get(user_id)
+        if cached is None:
+            return
+
+        vector = self.course_vector(course_id)
+        if vector is None or cached[1] < self.embedding_store.revision:
+            # The sum may hold an older vector for this course; rebuild on next read
+            self.sums.pop(user_id, None)
+            return
+        self.sums[user_id] = (cached[0] + sign * vector, cached[1])
@@ -37,11 +37,16 @@ export default function ChatbotWidget(props) {
           context,
           history: getHistory(),
           moduleId: props.currentModuleId,
+          stream: true,
         }),
       });
 
-      const data = await res.json();
-      setMessages((msgs) => [...msgs, { sender: "bot", text: data.response }]);
+      if (res.body && res.headers.get("Content-Type")?.includes("text/event-stream")) {
+        await readChatStream(res.body);
+      } else {
+        const data = await res.json();
+        setMessages((msgs) => [...msgs, { sender: "bot", text: data.response }]);
+      }
     } catch (err) {
       console.log(err);
       setMessages((msgs) => [
@@ -53,6 +58,48 @@ export default function ChatbotWidget(props) {
     }
   };
 
+  // Server-sent events from /api/chat: {"token"} chunks, then a final {"done"} event
+  const readChatStream = async (body: ReadableStream<Uint8Array>) => {
+    const reader = body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let started = false;
+
+    const showBotText = (update: (text: string) => string) => {
+      if (!started) {
+        started = true;
+        setLoading(false);
+        setMessages((msgs) => [...msgs, { sender: "bot", text: update("") }]);
+        return;
+      }
+      setMessages((msgs) => [
+        ...msgs.slice(0, -1),
+        { sender: "bot", text: update(msgs[msgs.length - 1].text) },
+      ]);
+    };
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      const events = buffer.split("\n\n");
+      buffer = events.pop() ?? "";
+      for (const event of events) {
+        if (!event.startsWith("data: ")) continue;
+        const data = JSON.parse(event.slice(6));
+        if (data.token) {
+          showBotText((text) => text + data.token);
+        } else if (data.done && !data.success) {
+          showBotText((text) => text || "Something went wrong. Please try again.");
+        } else if (data.done && !started) {
+          // No tokens streamed: show the server's fallback answer
+          showBotText(() => data.response || "Sorry, no answer found.");
+        }
+      }
+    }
+  };
+
   const getHistory = () => {
     const qaPairs = [];
     for (let i = 0; i < messages.length - 1; i++) {
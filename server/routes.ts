@@ -34,6 +34,23 @@ import type {
 } from ".prisma/client"; // Import Prisma types
 import axios from "axios";
 
+// Keep the recommender's stored profile for a user in sync with their enrollments
+function syncRecommendationProfile(
+  userId: number,
+  courseId: number,
+  action: "add" | "remove"
+) {
+  axios
+    .post("http://localhost:5001/recommend/profile", {
+      user_id: userId,
+      course_id: courseId,
+      action,
+    })
+    .catch((error) =>
+      console.error("⚠️ Error updating recommendation profile:", error.message)
+    );
+}
+
 // --- Multer Configuration for Video Uploads ---
 const projectRoot = path.join(
   path.dirname(fileURLToPath(import.meta.url)),
@@ -1171,9 +1188,11 @@ export async function registerRoutes(app: Express): Promise<Server> {
 
         res.json(updatedCourse);
         try {
-          await axios.post("http://localhost:5001/insert_questions", {
+          // Returns as soon as the ingest is queued; progress is at GET /jobs/:jobId on the Python service
+          const { data } = await axios.post("http://localhost:5001/insert_questions", {
             course_id: courseId,
           });
+          console.log(`Queued course ${courseId} ingest as job ${data.job_id}`);
         } catch (error) {
           console.log(error);
         }
@@ -1212,6 +1231,9 @@ export async function registerRoutes(app: Express): Promise<Server> {
           return res.status(403).json({ message: "Forbidden" });
         }
 
+        // Enrollments are removed with the course; the recommender is told about each one
+        const enrollments = await storage.getEnrollmentsByCourse(courseId);
+
         const deleted = await storage.deleteCourse(courseId);
         if (!deleted) {
           // This might happen in race conditions, treat as not found
@@ -1220,6 +1242,10 @@ export async function registerRoutes(app: Express): Promise<Server> {
             .json({ message: "Cannot delete course: it has related records" });
         }
 
+        for (const enrollment of enrollments) {
+          syncRecommendationProfile(enrollment.userId, courseId, "remove");
+        }
+
         res.status(204).send();
       } catch (error) {
         console.error("Error deleting course:", error);
@@ -1310,6 +1336,8 @@ export async function registerRoutes(app: Express): Promise<Server> {
         metadata: { title: courseDetails?.title }, // Prisma expects JsonNull or an object
       });
 
+      syncRecommendationProfile(userId, courseId, "add");
+
       res.status(201).json(newEnrollment);
     } catch (error) {
       // if (error instanceof z.ZodError) { ... }
@@ -1318,6 +1346,37 @@ export async function registerRoutes(app: Express): Promise<Server> {
     }
   });
 
+  app.delete("/api/enrollments/:courseId", isAuthenticated, async (req, res) => {
+    try {
+      const courseId = parseInt(req.params.courseId);
+      const userId = req.user!.id; // Assert req.user exists
+
+      if (isNaN(courseId)) {
+        return res.status(400).json({ message: "Invalid course ID" });
+      }
+
+      const userEnrollments = await storage.getEnrollmentsByUser(userId);
+      const enrollment = userEnrollments.find(
+        (enrollment) => enrollment.courseId === courseId
+      );
+      if (!enrollment) {
+        return res.status(404).json({ message: "Not enrolled in this course" });
+      }
+
+      const deleted = await storage.deleteEnrollment(enrollment.id);
+      if (!deleted) {
+        return res.status(500).json({ message: "Failed to unenroll" });
+      }
+
+      syncRecommendationProfile(userId, courseId, "remove");
+
+      res.status(204).send();
+    } catch (error) {
+      console.error("Error deleting enrollment:", error);
+      res.status(500).json({ message: "Internal server error" });
+    }
+  });
+
   // Module routes
   app.get(
     "/api/courses/:courseId/modules",